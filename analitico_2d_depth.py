@@ -2,26 +2,49 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 
-def perfil_velocidade_analitico_2d_depth(tau, Ny, g_lat, h):
+def perfil_velocidade_analitico_2d_depth(tau, Ny, g_lat, h, y=None):
     """
     Calcula o perfil de velocidade analítica para o duto quadrado pela
     aproximação em média em profundidade.
+
+    Os parâmetros podem ser arrays, combinados por broadcasting; o perfil
+    ganha um último eixo com as posições de amostragem. `y` são essas
+    posições (paredes em 0 e Ny), com o último eixo sendo o das amostras
+    e os demais combinados com os parâmetros; por padrão, 3000 pontos
+    igualmente espaçados em cada duto.
+
+    Retorna: array com shape (*parâmetros, pontos).
     """
+    tau, Ny, g_lat, h = (
+        np.asarray(p, dtype=float)[..., None] for p in (tau, Ny, g_lat, h)
+    )
     nu = (tau - 0.5) / 3.0
-    numero_pontos = 3000
-    y = np.linspace(0, Ny, numero_pontos)
+    if y is None:
+        numero_pontos = 3000
+        y = np.linspace(0, 1, numero_pontos) * Ny
+    y = np.asarray(y, dtype=float)
 
     # Centralizando o perfil no meio do canal (Ny / 2)
     # A fórmula correta para o argumento do cosh é (posição_centralizada) * sqrt(12) / h
-    termo1 = np.cosh((y - Ny / 2.0) * np.sqrt(12) / h)
-    termo2 = np.cosh((Ny / 2.0) * np.sqrt(12) / h)
+    # cosh(termo1) / cosh(termo2) escrito em exponenciais, sem overflow
+    termo1 = (y - Ny / 2.0) * np.sqrt(12) / h
+    termo2 = (Ny / 2.0) * np.sqrt(12) / h
+    razao = (np.exp(termo1 - termo2) + np.exp(-termo1 - termo2)) / (
+        1.0 + np.exp(-2.0 * termo2)
+    )
 
-    u = (g_lat * h**2) / (12 * nu) * (1 - termo1 / termo2)
+    u = (g_lat * h**2) / (12 * nu) * (1 - razao)
 
     return u
 
 
 def permeabilidade_analitica_2d_depth(tau, Ny, g_lat, h):
+    """
+    Permeabilidade da aproximação em média na profundidade (média exata
+    do perfil na largura). Aceita arrays de parâmetros (broadcasting).
+    """
+    Ny = np.asarray(Ny, dtype=float)
+    h = np.asarray(h, dtype=float)
     termo = h / (Ny * np.sqrt(3)) * np.tanh(Ny * np.sqrt(3) / h)
     k_final = h**2 / 12 * (1 - termo)  # * Ny / (Ny + 2.0)
 
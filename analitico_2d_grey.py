@@ -1,44 +1,192 @@
 import numpy as np
 
 
-def perfil_velocidade_analitico_2d_grey(tau, Ny, g_lat, h):
+def perfil_velocidade_analitico_2d_grey(tau, Ny, g_lat, h, y=None):
     """
     Calcula o perfil de velocidade analítica para o duto quadrado pela
     aproximação em média volumetrica (Grey-Poiseuille).
-    """
 
+    Os parâmetros podem ser arrays, combinados por broadcasting, e `y`
+    são as posições de amostragem (paredes em 0 e Ny) no último eixo,
+    como em `analitico_2d_depth.perfil_velocidade_analitico_2d_depth`;
+    por padrão, 3000 pontos igualmente espaçados em cada duto. Para k e
+    phi variáveis na largura, ver `perfil_velocidade_2d_grey_celulas`.
+
+    Retorna: array com shape (*parâmetros, pontos).
+    """
+    tau, Ny, g_lat, h = (
+        np.asarray(p, dtype=float)[..., None] for p in (tau, Ny, g_lat, h)
+    )
     nu = (tau - 0.5) / 3.0
 
     k = (h**2) / 12.0
     phi = 0.9999
 
     # Lambda e termo particular
-    lambda_ = np.sqrt(phi / k) if k > 0 else 0
+    with np.errstate(divide="ignore"):
+        lambda_ = np.sqrt(phi / k)
     U_particular = (k / nu) * g_lat
 
-    # Montagem do Sistema Linear (2x2) para u(0) = 0 e u(Ny) = 0
-    M = np.array([[1.0, 1.0], [np.exp(lambda_ * Ny), np.exp(-lambda_ * Ny)]])
-    b_vec = np.array([-U_particular, -U_particular])
-
-    # Resolução dos coeficientes A e B
-    A, B = np.linalg.solve(M, b_vec)
+    if y is None:
+        numero_pontos = 3000  # Resolução aumentada para precisão na média
+        y = np.linspace(0, 1, numero_pontos) * Ny
+    y = np.asarray(y, dtype=float)
 
-    # Construção do array de velocidades
-    numero_pontos = 3000  # Resolução aumentada para precisão na média
-    y = np.linspace(0, Ny, numero_pontos)
-    u = A * np.exp(lambda_ * y) + B * np.exp(-lambda_ * y) + U_particular
+    # Solução de u'' - lambda² u = -lambda² U com u(0) = 0 e u(Ny) = 0:
+    # u = U (1 - cosh(lambda (y - Ny/2)) / cosh(lambda Ny/2)), com a razão
+    # de cosh em exponenciais, sem overflow
+    s = lambda_ * (y - Ny / 2.0)
+    S = lambda_ * Ny / 2.0
+    with np.errstate(invalid="ignore"):
+        razao = (np.exp(s - S) + np.exp(-s - S)) / (1.0 + np.exp(-2.0 * S))
+    # abertura nula (k = 0): sem escoamento
+    u = np.where(k > 0, U_particular * (1.0 - razao), 0.0)
 
     return u
 
 
 def permeabilidade_analitica_2d_grey(tau, Ny, g_lat, h_aperture_lat):
+    """
+    Permeabilidade pela média exata do perfil na largura,
+    k (1 - tanh(lambda Ny/2) / (lambda Ny/2)). Aceita arrays de
+    parâmetros (broadcasting).
+    """
+    Ny = np.asarray(Ny, dtype=float)
+    k = np.asarray(h_aperture_lat, dtype=float) ** 2 / 12.0
+    phi = 0.9999
 
-    u = perfil_velocidade_analitico_2d_grey(tau, Ny, g_lat, h_aperture_lat)
-    nu = (tau - 0.5) / 3.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        S = np.sqrt(phi / k) * Ny / 2.0
+        k_anal = np.where(k > 0, k * (1.0 - np.tanh(S) / S), 0.0)
 
     # Permeabilidade média e aplicação da correção LBM
-    k_anal = (np.mean(u)) * nu / g_lat
     fator_correcao = Ny / (Ny + 2.0)
     k_final = k_anal  # * fator_correcao
+    if k_final.ndim == 0:
+        k_final = k_final[()]
+
+    return k_final, k_final / 0.0009869233
+
+
+def perfil_velocidade_2d_grey_celulas(tau, g_lat, k, phi=0.9999, dy=1.0):
+    """
+    Perfil de velocidade nos centros das células para um meio cinza
+    heterogêneo na largura: `k` e `phi` por célula (arrays de mesmo
+    tamanho ou escalares), células de largura `dy` e paredes com u = 0
+    nas faces externas. Para um perfil de abertura medido h(y), use
+    k = h**2 / 12.
+
+    Resolve u'' - (phi / k) u = -phi g / nu (ver `_resolver_brinkman`).
+    Nós sólidos têm k = 0.
+    """
+    u_centro, _ = _resolver_brinkman(tau, g_lat, k, phi, dy)
+    return u_centro
+
 
+def permeabilidade_2d_grey_celulas(tau, g_lat, k, phi=0.9999, dy=1.0):
+    """
+    Permeabilidade do meio cinza heterogêneo de
+    `perfil_velocidade_2d_grey_celulas`, pela média exata do perfil em
+    cada célula.
+    """
+    nu = (tau - 0.5) / 3.0
+    _, u_medio = _resolver_brinkman(tau, g_lat, k, phi, dy)
+    k_final = np.mean(u_medio) * nu / g_lat
     return k_final, k_final / 0.0009869233
+
+
+def _resolver_brinkman(tau, g_lat, k, phi, dy):
+    """
+    Solução exata para k e phi constantes por célula. Em cada célula, com
+    lambda = sqrt(phi / k) e U = k g / nu, o perfil é
+    U + (u_e - U) sinh(lambda (dy - s)) / sinh(lambda dy)
+      + (u_d - U) sinh(lambda s) / sinh(lambda dy),
+    dado pelas velocidades u_e e u_d das suas faces. A continuidade de u'
+    nas faces internas leva a um sistema tridiagonal simétrico e
+    diagonalmente dominante nessas velocidades, resolvido em O(N) pelo
+    algoritmo de Thomas. As funções hiperbólicas aparecem apenas em
+    razões limitadas (sem exp(lambda Ny)), com séries para lambda dy
+    pequeno, o que mantém a solução estável para qualquer Ny / h.
+
+    Retorna: (u nos centros, u médio) de cada célula.
+    """
+    nu = (tau - 0.5) / 3.0
+    k, phi = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(k, dtype=float)),
+        np.atleast_1d(np.asarray(phi, dtype=float)),
+    )
+    if np.any(k < 0) or np.any(phi < 0):
+        raise ValueError("k e phi devem ser não negativos.")
+    forca = phi * g_lat / nu
+
+    # meia largura adimensional y = lambda dy / 2; k = 0 (sólido) -> y = inf
+    with np.errstate(divide="ignore"):
+        y = 0.5 * dy * np.sqrt(phi / k)
+    pequeno = y < 1e-3
+    y2 = y**2
+    e = np.exp(-2.0 * y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tanh_y = np.where(pequeno, 1.0 - y2 / 3.0, (1.0 - e) / (1.0 + e) / y)
+        # x coth x e x csch x, com x = 2 y
+        x_coth = np.where(
+            pequeno, 1.0 + 4.0 * y2 / 3.0, 2.0 * y * (1.0 + e**2) / (1.0 - e**2)
+        )
+        x_csch = np.where(
+            pequeno, 1.0 - 2.0 * y2 / 3.0, 4.0 * y * e / (1.0 - e**2)
+        )
+        sech = 2.0 * np.sqrt(e) / (1.0 + e)
+        # (1 - sech y) / y² e (1 - tanh(y) / y) / y²: parte particular do
+        # perfil no centro e na média da célula
+        f_centro = np.where(pequeno, 0.5 - 5.0 * y2 / 24.0, (1.0 - sech) / y2)
+        f_medio = np.where(
+            pequeno, 1.0 / 3.0 - 2.0 * y2 / 15.0, (1.0 - tanh_y) / y2
+        )
+    solido = np.isinf(y)
+    x_coth = np.where(solido, 1.0, x_coth)
+    x_csch = np.where(solido, 0.0, x_csch)
+    tanh_y = np.where(solido, 0.0, tanh_y)
+    f_centro = np.where(solido, 0.0, f_centro)
+    f_medio = np.where(solido, 0.0, f_medio)
+
+    # faces internas 1..N-1: -s_{j-1} u_{j-1} + (c_{j-1} + c_j) u_j
+    # - s_j u_{j+1} = r_{j-1} + r_j, com c = x coth x / dy e s = x csch x / dy
+    c = x_coth / dy
+    s = x_csch / dy
+    # nas células sólidas, c -> inf: a face fica presa em u = 0
+    c = np.where(solido, 1e300, c)
+    r = forca * 0.5 * dy * tanh_y
+    faces = np.zeros(k.size + 1)
+    if k.size > 1:
+        faces[1:-1] = _resolver_tridiagonal(
+            -s[1:-1], c[:-1] + c[1:], -s[1:-1], r[:-1] + r[1:]
+        )
+
+    soma = faces[:-1] + faces[1:]
+    u_centro = soma * np.where(
+        solido, 0.0, 0.5 * sech
+    ) + forca * dy**2 / 4 * (f_centro)
+    u_medio = soma * 0.5 * tanh_y + forca * dy**2 / 4 * f_medio
+    return u_centro, u_medio
+
+
+def _resolver_tridiagonal(inferior, diagonal, superior, rhs):
+    """
+    Algoritmo de Thomas para a matriz tridiagonal com `diagonal` e as
+    diagonais `inferior` (a[i] multiplica x[i - 1]) e `superior` (b[i]
+    multiplica x[i + 1]); sem pivotamento, pois a matriz é diagonalmente
+    dominante.
+    """
+    a = np.concatenate([[0.0], inferior]).tolist()
+    b = diagonal.tolist()
+    c = np.concatenate([superior, [0.0]]).tolist()
+    d = rhs.tolist()
+    n = len(b)
+    for i in range(1, n):
+        m = a[i] / b[i - 1]
+        b[i] -= m * c[i - 1]
+        d[i] -= m * d[i - 1]
+    x = [0.0] * n
+    x[-1] = d[-1] / b[-1]
+    for i in range(n - 2, -1, -1):
+        x[i] = (d[i] - c[i] * x[i + 1]) / b[i]
+    return np.array(x)
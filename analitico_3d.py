@@ -1,18 +1,69 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 
+# Harmônicos avaliados por bloco na matriz harmônico x posição, o que
+# limita a memória a BLOCO_HARMONICOS * número de pontos; com arrays de
+# parâmetros, o bloco também é limitado a ELEMENTOS_POR_BLOCO elementos
+BLOCO_HARMONICOS = 256
+ELEMENTOS_POR_BLOCO = 2**22
 
-def permeabilidade_analitica_3d(tau, Ny, g_lat, h):
+
+def termos_necessarios(limite, potencia):
+    """
+    Menor número K de termos ímpares n = 1, 3, ..., 2K - 1 tal que a cauda
+    sum_{n > 2K - 1} 1 / n**potencia, limitada pela integral
+    (2K - 1)**(1 - potencia) / (2 (potencia - 1)), não passa de `limite`
+    (escalar ou array).
+    """
+    limite = np.asarray(limite, dtype=float)
+    if np.any(limite <= 0):
+        raise ValueError("A tolerância da série deve ser positiva.")
+    n = (2 * (potencia - 1) * limite) ** (-1.0 / (potencia - 1))
+    K = np.maximum(1, np.ceil((n + 1) / 2)).astype(int)
+    return int(K) if K.ndim == 0 else K
+
+
+def _harmonicos_por_bloco(elementos):
+    """Harmônicos por bloco para `elementos` (parâmetros x posições)."""
+    return max(
+        1, min(BLOCO_HARMONICOS, ELEMENTOS_POR_BLOCO // max(elementos, 1))
+    )
+
+
+def permeabilidade_analitica_3d(
+    tau, Ny, g_lat, h, n_terms=None, tolerancia=0.0, rtol=1e-12
+):
     """
     Calcula a permeabilidade analítica para um duto 3D (Full).
+
+    Os parâmetros podem ser arrays, combinados por broadcasting.
+
+    `n_terms` é o número de termos (ímpares) da série; None trunca a
+    série quando a cota da cauda fica abaixo de max(tolerancia, rtol * k)
+    em todos os dutos. A série é somada na direção do menor semilado, o
+    que a torna bem condicionada e de convergência rápida em fendas finas
+    e dutos altos.
     """
-    a = Ny / 2
-    b = h / 2
-    S = 0.0
-    n_terms = 100  # Número de termos na série
-    for n in range(1, n_terms * 2, 2):
-        S += np.tanh(n * np.pi * b / (2 * a)) / n**5
-    k = a**2 / 3 - (64 * a**3) / (b * np.pi**5) * S
+    Ny = np.asarray(Ny, dtype=float)
+    h = np.asarray(h, dtype=float)
+    # a: menor semilado; k = a²/3 (1 - 192 a / (π⁵ b) S) é simétrica
+    a = np.minimum(Ny, h) / 2
+    b = np.maximum(Ny, h) / 2
+    fator = (64 * a**3) / (b * np.pi**5)
+    if n_terms is None:
+        # a²/9 é uma cota inferior de k (a razão 192 a / (π⁵ b) S < 0.64)
+        limite = np.maximum(tolerancia, rtol * a**2 / 9)
+        n_terms = int(np.max(termos_necessarios(limite / fator, 5)))
+
+    S = np.zeros(a.shape)
+    bloco = _harmonicos_por_bloco(a.size)
+    for inicio in range(0, n_terms, bloco):
+        n = np.arange(
+            2 * inicio + 1, 2 * min(inicio + bloco, n_terms), 2, dtype=float
+        ).reshape((-1,) + (1,) * a.ndim)
+        S = S + np.sum(np.tanh(n * np.pi * b / (2 * a)) / n**5, axis=0)
+    k = a**2 / 3 - fator * S
 
     # u_bar = 0.0
     # a = Ny / 2
@@ -47,44 +98,244 @@ def permeabilidade_analitica_3d(tau, Ny, g_lat, h):
     # Correção para o LBM: considerando os voxeis sólidos de borda
     fator_correcao = (4 * a * b) / ((2 * a + 2) * (2 * b + 2))
     k_final = k #* fator_correcao
+    if k_final.ndim == 0:
+        k_final = k_final[()]
 
     return k_final, k_final / 0.0009869233
 
 
-def perfil_velocidade_analitico_3d(tau, Ny, g_lat, h):
+def perfil_velocidade_analitico_3d(
+    tau, Ny, g_lat, h, n_terms=None, y=None, tolerancia=0.0, rtol=1e-6
+):
     """
     Calcula a velocidade média na profundidade u_bar(x)
     para a seção transversal de um duto retangular (integração em y).
+
+    Os parâmetros podem ser arrays, combinados por broadcasting; o perfil
+    ganha um último eixo com as posições de amostragem. `y` são essas
+    posições (paredes em 0 e Ny), por exemplo os centros das células do
+    LBM, com o último eixo sendo o das amostras e os demais combinados
+    com os parâmetros; por padrão, 3000 pontos igualmente espaçados em
+    cada duto.
+
+    `n_terms` fixa o número de termos (ímpares) da série em cossenos na
+    largura. Com None, a série de cada duto é truncada quando a cota da
+    cauda fica abaixo de max(tolerancia, rtol * u_max), em unidades de
+    velocidade, usando a expansão que exige menos termos: em cossenos na
+    largura (termos ~ 1/n³) ou em senos na profundidade (termos ~ 1/m⁴,
+    rápida em fendas finas).
+
+    Retorna: array com shape (*parâmetros, pontos).
     """
-    u_bar = 0.0
+    tau, Ny, g_lat, h = (
+        np.asarray(p, dtype=float)[..., None] for p in (tau, Ny, g_lat, h)
+    )
+    if y is None:
+        numero_pontos = 3000  # Resolução aumentada para precisão na média
+        y = np.linspace(0, 1, numero_pontos) * Ny
+    y = np.asarray(y, dtype=float)
+
+    # uma linha (duto, posições) por combinação de parâmetros
+    forma = np.broadcast_shapes(
+        tau.shape, Ny.shape, g_lat.shape, h.shape, y.shape
+    )
+    tau, Ny, g_lat, h = (
+        np.broadcast_to(p, forma[:-1] + (1,)).reshape(-1, 1)
+        for p in (tau, Ny, g_lat, h)
+    )
+    y = np.broadcast_to(y, forma).reshape(-1, forma[-1])
+
     a = Ny / 2
     b = h / 2
-    S = 0.0
     nu = (tau - 0.5) / 3.0
     coef = 16 * g_lat * a**2 / (nu * np.pi**3)
-    n_terms = 100
+    coef_profundidade = 8 * g_lat * h**2 / (nu * np.pi**4)
+    # Deslocamos o 'x' para que o centro do duto seja matematicamente o 0
+    x_math = y - a
 
-    numero_pontos = 3000  # Resolução aumentada para precisão na média
-    x = np.linspace(0, Ny, numero_pontos)
+    if n_terms is None:
+        # primeiro termo da expansão na profundidade no centro: todos os
+        # termos são positivos ali, então é uma cota inferior de u_max
+        sech = 2 * np.exp(-np.pi * a / h) / (1 + np.exp(-2 * np.pi * a / h))
+        u_min = abs(coef_profundidade) * (1.0 - sech)
+        limite = np.maximum(tolerancia, rtol * u_min)
+        # dutos sem força (coef = 0) ficam com um único termo
+        nulo = coef == 0
+        n_largura = termos_necessarios(
+            np.where(nulo, 1.0, limite / np.where(nulo, 1.0, abs(coef))), 3
+        )
+        n_profundidade = termos_necessarios(
+            np.where(
+                nulo,
+                1.0,
+                limite / np.where(nulo, 1.0, abs(coef_profundidade)),
+            ),
+            4,
+        )
+        profundidade = n_profundidade < n_largura
+        n_terms = np.where(profundidade, n_profundidade, n_largura)
+    else:
+        profundidade = np.zeros(a.shape, dtype=bool)
+        n_terms = np.full(a.shape, n_terms)
+
+    u_bar = np.zeros(x_math.shape)
+    for expansao in (False, True):
+        sel = profundidade[:, 0] == expansao
+        if not sel.any():
+            continue
+        u_bar[sel] = (
+            _serie_perfil_3d(
+                expansao, int(n_terms[sel].max()), a[sel], b[sel], x_math[sel]
+            )
+            * np.where(expansao, coef_profundidade, coef)[sel]
+        )
+
+    return u_bar.reshape(forma)
 
-    # --- CORREÇÃO AQUI ---
-    # Deslocamos o 'x' para que o centro do duto seja matematicamente o 0
-    x_math = x - a
 
-    for n in range(1, n_terms * 2, 2):  # Apenas ímpares
-        # Termo resultante da integração na profundidade
-        termo_int = 1.0 - (2 * a / (n * np.pi * b)) * np.tanh(
-            n * np.pi * b / (2 * a)
+def _serie_perfil_3d(profundidade, n_terms, a, b, x_math):
+    """
+    Soma, por blocos de harmônicos, a série em cossenos na largura ou em
+    senos na profundidade (sem o coeficiente) para os dutos nas linhas de
+    `x_math` (dutos, posições); `a` e `b` são os semilados (dutos, 1).
+    """
+    u_bar = np.zeros(x_math.shape)
+    bloco = _harmonicos_por_bloco(x_math.size)
+    for inicio in range(0, n_terms, bloco):
+        # Apenas ímpares
+        n = np.arange(2 * inicio + 1, 2 * min(inicio + bloco, n_terms), 2)[
+            :, None, None
+        ]
+        if profundidade:
+            # cosh(k x) / cosh(k a) em exponenciais, sem overflow
+            k = n * np.pi / (2 * b)
+            razao = (np.exp(k * (x_math - a)) + np.exp(-k * (x_math + a))) / (
+                1.0 + np.exp(-2 * k * a)
+            )
+            u_bar += np.sum((1.0 - razao) / n**4.0, axis=0)
+        else:
+            # Termo resultante da integração na profundidade
+            termo_int = 1.0 - (2 * a / (n * np.pi * b)) * np.tanh(
+                n * np.pi * b / (2 * a)
+            )
+            sinal = np.where(n % 4 == 1, 1.0, -1.0)
+            u_bar += np.sum(
+                sinal
+                / n**3.0
+                * termo_int
+                * np.cos(n * np.pi * x_math / (2 * a)),
+                axis=0,
+            )
+    return u_bar
+
+
+def campo_velocidade_analitico_3d(
+    tau,
+    Ny,
+    g_lat,
+    h,
+    x=None,
+    y=None,
+    out=None,
+    memoria_max=64 * 1024**2,
+    n_terms=None,
+    tolerancia=0.0,
+    rtol=1e-6,
+):
+    """
+    Campo de velocidade u(x, y) na seção transversal do duto retangular,
+    com x na largura (paredes em 0 e Ny) e y na profundidade (paredes em
+    0 e h), como nos volumes do LBPM.
+
+    Em vez da série dupla, usa a forma separável em uma série simples:
+    senos no menor lado e cosh (em forma fechada) no outro,
+    u = sum_m 4 g L² / (nu m³ π³) sin(m π s / L) (1 - cosh(...) / cosh(...)).
+    O campo é montado em faixas de linhas: para cada faixa e bloco de
+    harmônicos, o produto de uma matriz harmônico x posição de cada eixo,
+    de modo que os temporários cabem (aproximadamente) em `memoria_max`
+    bytes.
+
+    `x` e `y` são as posições de amostragem; por padrão, os centros dos
+    voxels (Ny e round(h) pontos). Pontos fora do duto recebem zero.
+    `out` é um array (len(x), len(y)) já alocado (por exemplo um
+    np.memmap), o caminho de um .npy a criar como memmap, ou None.
+    `n_terms`, `tolerancia` e `rtol` truncam a série como em
+    `perfil_velocidade_analitico_3d`.
+
+    Retorna: o array de saída.
+    """
+    nu = (tau - 0.5) / 3.0
+    if x is None:
+        x = np.arange(Ny) + 0.5
+    if y is None:
+        y = np.arange(int(round(h))) + 0.5
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+
+    forma = (x.size, y.size)
+    if out is None:
+        out = np.empty(forma)
+    elif isinstance(out, (str, os.PathLike)):
+        out = np.lib.format.open_memmap(
+            out, mode="w+", dtype=np.float64, shape=forma
         )
+    elif out.shape != forma:
+        raise ValueError(f"`out` deve ter shape {forma}, não {out.shape}")
+
+    # senos no menor lado L, cosh no maior (série de convergência rápida)
+    if h <= Ny:
+        L, comprimento, seno, cosh_pos, saida = h, Ny, y, x, out
+    else:
+        L, comprimento, seno, cosh_pos, saida = Ny, h, x, y, out.T
+    c = comprimento / 2
+    coef = 4 * g_lat * L**2 / (nu * np.pi**3)
 
-        termo_n = (
-            ((-1) ** ((n - 1) // 2) / n**3)
-            * termo_int
-            * np.cos(n * np.pi * x_math / (2 * a))  # Usa o x_math aqui!
+    if n_terms is None and g_lat == 0:
+        n_terms = 1
+    elif n_terms is None:
+        # cota inferior de u_max: primeiro termo da média no lado L
+        u_min = (
+            8
+            * abs(g_lat)
+            * L**2
+            / (nu * np.pi**4)
+            * (1.0 - 1.0 / np.cosh(np.pi * c / L))
         )
-        u_bar += termo_n
+        limite = max(tolerancia, rtol * u_min)
+        n_terms = termos_necessarios(limite / abs(coef), 3)
+
+    # harmônicos por bloco e linhas por faixa dentro do orçamento (float64):
+    # bloco x len(seno) dos senos, ~3 bloco x faixa dos cosh e 2 faixa x
+    # len(seno) do acumulado e do produto
+    orcamento = max(memoria_max // 8, 1)
+    bloco = max(1, min(n_terms, BLOCO_HARMONICOS, orcamento // (4 * seno.size)))
+    faixa = max(
+        1, (orcamento - bloco * seno.size) // (3 * bloco + 2 * seno.size)
+    )
+
+    dentro_seno = (seno >= 0) & (seno <= L)
+    dentro_cosh = (cosh_pos >= 0) & (cosh_pos <= comprimento)
+    for inicio in range(0, cosh_pos.size, faixa):
+        t = cosh_pos[inicio : inicio + faixa]
+        acumulado = np.zeros((t.size, seno.size))
+        for m0 in range(0, n_terms, bloco):
+            # Apenas ímpares
+            m = np.arange(2 * m0 + 1, 2 * min(m0 + bloco, n_terms), 2)[:, None]
+            k = m * np.pi / L
+            # 1 - cosh(k (t - c)) / cosh(k c), em exponenciais sem overflow
+            perfil = 1.0 - (np.exp(k * (t - 2 * c)) + np.exp(-k * t)) / (
+                1.0 + np.exp(-2 * k * c)
+            )
+            modos = np.sin(k * seno) / m**3.0
+            acumulado += perfil.T @ modos
+        acumulado *= coef
+        acumulado[~dentro_cosh[inicio : inicio + faixa]] = 0.0
+        acumulado[:, ~dentro_seno] = 0.0
+        saida[inicio : inicio + faixa] = acumulado
 
-    return u_bar * coef
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
 
 
 if __name__ == "__main__":
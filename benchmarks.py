@@ -0,0 +1,445 @@
+import argparse
+import base64
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import analitico_3d
+import lbm_autoral
+
+# Reticulados (nx, ny) de `halfway` e passos de tempo fixos de cada um,
+# escolhidos para que cada medição leve de décimos de segundo a segundos
+RETICULADOS = [
+    ((3, 24), 2000),
+    ((3, 80), 1000),
+    ((64, 64), 200),
+    ((512, 512), 20),
+]
+
+# Opções de motor medidas em todos os reticulados; o laço só nos pequenos
+MOTORES = {
+    "vetorizado": {"motor": "vetorizado"},
+    "vetorizado_buffer_unico": {"motor": "vetorizado", "buffer_unico": True},
+    "numba": {"motor": "numba"},
+    "numba_buffer_unico": {"motor": "numba", "buffer_unico": True},
+    "numba_float32_desvio": {"motor": "numba", "precisao": "float32_desvio"},
+}
+PASSOS_LACO = {(3, 24): 100, (3, 80): 40}
+
+# Número de termos das séries de analitico_3d
+TERMOS = [10, 100, 1000]
+
+# Reticulados (nx, ny, nz) dos arquivos PVTI sintéticos e número de peças
+PVTI = [
+    ((24, 24, 16), 2),
+    ((80, 80, 32), 4),
+    ((128, 128, 128), 8),
+]
+
+
+def medir(funcao, repeticoes=5, aquecimento=1):
+    """
+    Tempo de parede de `funcao()`, descartando `aquecimento` chamadas
+    iniciais (compilação do numba, caches de disco). A saída no console
+    da função é suprimida.
+
+    Retorna: dicionário com mediana_s, minimo_s e repeticoes.
+    """
+    tempos = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(aquecimento):
+            funcao()
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+    return {
+        "mediana_s": float(np.median(tempos)),
+        "minimo_s": float(np.min(tempos)),
+        "repeticoes": repeticoes,
+    }
+
+
+def casos_halfway():
+    """
+    Casos (nome, função, nós atualizados por chamada) de `halfway` no
+    reticulado completo, mais o modo reduzido como caso à parte.
+    """
+    casos = []
+    for (nx, ny), passos in RETICULADOS:
+        opcoes_por_motor = dict(MOTORES)
+        if (nx, ny) in PASSOS_LACO:
+            opcoes_por_motor["laco"] = {"motor": "laco"}
+        for nome_motor, opcoes in opcoes_por_motor.items():
+            n = PASSOS_LACO[(nx, ny)] if nome_motor == "laco" else passos
+            casos.append(
+                (
+                    f"halfway/{nx}x{ny}/{nome_motor}",
+                    _funcao_halfway(nx, ny, n, opcoes),
+                    nx * ny * n,
+                )
+            )
+        # modo de uma coluna (abertura uniforme): mede 1 x ny nós por passo
+        if nx > 1:
+            casos.append(
+                (
+                    f"halfway/{nx}x{ny}/vetorizado_reduzido",
+                    _funcao_halfway(
+                        nx,
+                        ny,
+                        passos,
+                        {"motor": "vetorizado", "reduzido": True},
+                    ),
+                    ny * passos,
+                )
+            )
+    return casos
+
+
+def _funcao_halfway(nx, ny, passos, opcoes):
+    # a abertura é uniforme: sem reduzido=False, halfway resolveria uma
+    # única coluna e os casos deixariam de comparar os motores em nx x ny
+    opcoes = {"reduzido": False, **opcoes}
+
+    def executar():
+        # tolerância zero: sempre `passos` passos de tempo
+        convergencia = lbm_autoral.Convergencia(
+            tolerancia=0.0, intervalo=passos, max_passos=passos, callback=None
+        )
+        lbm_autoral.halfway(
+            1.1,
+            nx,
+            ny,
+            [1.0e-8, 0.0],
+            8.0,
+            convergencia=convergencia,
+            **opcoes,
+        )
+
+    return executar
+
+
+def casos_analitico_3d():
+    """Casos de perfil e permeabilidade do duto 3D por número de termos."""
+    casos = []
+    for n_terms in TERMOS:
+        casos.append(
+            (
+                f"analitico_3d/perfil/{n_terms}",
+                lambda n=n_terms: analitico_3d.perfil_velocidade_analitico_3d(
+                    1.1, 80, 1.0e-8, 8.0, n_terms=n
+                ),
+                None,
+            )
+        )
+        casos.append(
+            (
+                f"analitico_3d/permeabilidade/{n_terms}",
+                lambda n=n_terms: analitico_3d.permeabilidade_analitica_3d(
+                    1.1, 80, 1.0e-8, 8.0, n_terms=n
+                ),
+                None,
+            )
+        )
+    # truncamento adaptativo (tolerância padrão), nos centros das células
+    casos.append(
+        (
+            "analitico_3d/perfil/adaptativo",
+            lambda: analitico_3d.perfil_velocidade_analitico_3d(
+                1.1, 80, 1.0e-8, 8.0, y=np.arange(80) + 0.5
+            ),
+            None,
+        )
+    )
+    casos.append(
+        (
+            "analitico_3d/permeabilidade/adaptativo",
+            lambda: analitico_3d.permeabilidade_analitica_3d(
+                1.1, 80, 1.0e-8, 8.0
+            ),
+            None,
+        )
+    )
+    # mapa de projeto (Ny, h) em uma única chamada vetorizada
+    casos.append(
+        (
+            "analitico_3d/mapa_permeabilidade/100x100",
+            lambda: analitico_3d.permeabilidade_analitica_3d(
+                1.1,
+                np.arange(8, 408, 4)[:, None],
+                1.0e-8,
+                np.geomspace(2.0, 200.0, 100),
+            ),
+            None,
+        )
+    )
+    # campo completo da seção na resolução de um volume do LBPM
+    casos.append(
+        (
+            "analitico_3d/campo/512x512",
+            lambda: analitico_3d.campo_velocidade_analitico_3d(
+                1.1, 512, 1.0e-8, 512.0
+            ),
+            None,
+        )
+    )
+    return casos
+
+
+def casos_lbpm(pasta):
+    """
+    Casos de `ler_vtk.perfil_velocidade_lbpm` sobre PVTI sintéticos gerados
+    em `pasta`, em base64 inline e em dados anexados brutos (lidos sem
+    cópia). Sem as dependências do ler_vtk, retorna uma lista vazia.
+    """
+    try:
+        import ler_vtk
+    except ImportError as e:
+        print(f"ler_vtk indisponível ({e}): casos do LBPM pulados.")
+        return []
+
+    casos = []
+    for ((nx, ny, nz), pecas), formato in itertools.product(
+        PVTI, ("binary", "appended")
+    ):
+        sufixo = "" if formato == "binary" else "/anexado"
+        simulacao = os.path.join(pasta, f"lbpm_{nx}x{ny}x{nz}_{formato}")
+        gerar_pvti_sintetico(
+            os.path.join(simulacao, "vis00100"),
+            nx,
+            ny,
+            nz,
+            pecas,
+            formato=formato,
+        )
+        casos.append(
+            (
+                f"lbpm/perfil/{nx}x{ny}x{nz}{sufixo}",
+                lambda s=simulacao: ler_vtk.perfil_velocidade_lbpm(s),
+                None,
+            )
+        )
+    return casos
+
+
+def gerar_pvti_sintetico(
+    pasta, nx, ny, nz, pecas=1, campos=("Velocity_z",), formato="binary"
+):
+    """
+    Grava em `pasta` um summary.pvti com `pecas` arquivos .vti (divididos
+    em z), com dados de célula float64 sem compressão: `formato` "binary"
+    (base64 inline) ou "appended" (dados anexados brutos). Cada campo
+    recebe um perfil de Poiseuille em x modulado em y.
+
+    Retorna: o campo (nx, ny, nz) gravado.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    x = np.arange(nx) + 0.5
+    y = np.arange(ny) + 0.5
+    valores = (
+        (x * (nx - x))[:, None, None]
+        * (1.0 + 0.1 * np.sin(2 * np.pi * y / ny))[None, :, None]
+        * np.ones(nz)
+        * 1.0e-6
+    )
+
+    extensao = f"0 {nx} 0 {ny} 0 {nz}"
+    linhas = [
+        '<?xml version="1.0"?>',
+        '<VTKFile type="PImageData" version="1.0" '
+        'byte_order="LittleEndian" header_type="UInt32">',
+        f'  <PImageData WholeExtent="{extensao}" GhostLevel="0" '
+        'Origin="0 0 0" Spacing="1 1 1">',
+        "    <PCellData>",
+    ]
+    for campo in campos:
+        linhas.append(f'      <PDataArray type="Float64" Name="{campo}"/>')
+    linhas.append("    </PCellData>")
+
+    limites = np.linspace(0, nz, pecas + 1).astype(int)
+    for n, (z0, z1) in enumerate(zip(limites[:-1], limites[1:])):
+        arquivo = f"{n:05d}.vti"
+        extensao_peca = f"0 {nx} 0 {ny} {z0} {z1}"
+        linhas.append(
+            f'    <Piece Extent="{extensao_peca}" Source="{arquivo}"/>'
+        )
+        _gravar_vti(
+            os.path.join(pasta, arquivo),
+            extensao_peca,
+            {campo: valores[:, :, z0:z1] for campo in campos},
+            formato,
+        )
+    linhas += ["  </PImageData>", "</VTKFile>"]
+
+    with open(os.path.join(pasta, "summary.pvti"), "w") as f:
+        f.write("\n".join(linhas) + "\n")
+    return valores
+
+
+def _gravar_vti(caminho, extensao, campos, formato="binary"):
+    anexo = b""
+    with open(caminho, "wb") as f:
+        f.write(
+            b'<?xml version="1.0"?>\n'
+            b'<VTKFile type="ImageData" version="1.0" '
+            b'byte_order="LittleEndian" header_type="UInt32">\n'
+            + f'  <ImageData WholeExtent="{extensao}" Origin="0 0 0" '
+            'Spacing="1 1 1">\n'
+            f'    <Piece Extent="{extensao}">\n'
+            "      <CellData>\n".encode("ascii")
+        )
+        for nome, valores in campos.items():
+            # ordem do VTK: x varia mais rápido
+            dados = np.asarray(valores, dtype="<f8").tobytes(order="F")
+            bloco = struct.pack("<I", len(dados)) + dados
+            if formato == "appended":
+                f.write(
+                    f'        <DataArray type="Float64" Name="{nome}" '
+                    f'format="appended" offset="{len(anexo)}"/>\n'.encode(
+                        "ascii"
+                    )
+                )
+                anexo += bloco
+                continue
+            f.write(
+                f'        <DataArray type="Float64" Name="{nome}" '
+                'format="binary">\n'
+                f"          {base64.b64encode(bloco).decode('ascii')}\n"
+                "        </DataArray>\n".encode("ascii")
+            )
+        f.write(b"      </CellData>\n    </Piece>\n  </ImageData>\n")
+        if formato == "appended":
+            f.write(b'  <AppendedData encoding="raw">\n   _' + anexo)
+            f.write(b"\n  </AppendedData>\n")
+        f.write(b"</VTKFile>\n")
+
+
+def executar_benchmarks(filtro=None, repeticoes=5):
+    """
+    Mede todos os casos cujo nome contém `filtro` (todos se None). Os PVTI
+    sintéticos são gerados em um diretório temporário, removido ao final.
+
+    Retorna: dicionário {nome: medição}, com mlups nos casos de `halfway`.
+    """
+    pasta = tempfile.mkdtemp(prefix="benchmarks_")
+    try:
+        casos = casos_halfway() + casos_analitico_3d() + casos_lbpm(pasta)
+        resultados = {}
+        for nome, funcao, nos in casos:
+            if filtro is not None and filtro not in nome:
+                continue
+            medicao = medir(funcao, repeticoes=repeticoes)
+            if nos is not None:
+                medicao["mlups"] = nos / medicao["mediana_s"] / 1e6
+            resultados[nome] = medicao
+            print(f"{nome:<45} {medicao['mediana_s']:>12.6f} s")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultados
+
+
+def metadados():
+    """Ambiente da medição, gravado junto com o baseline."""
+    numba = lbm_autoral.numba
+    return {
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "plataforma": platform.platform(),
+        "processador": platform.processor(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__ if numba is not None else None,
+        "cpus": (
+            len(os.sched_getaffinity(0))
+            if hasattr(os, "sched_getaffinity")
+            else os.cpu_count()
+        ),
+    }
+
+
+def salvar_baseline(resultados, caminho):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(
+            {"metadados": metadados(), "resultados": resultados}, f, indent=2
+        )
+
+
+def carregar_baseline(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(resultados, baseline, tolerancia=0.2):
+    """
+    Compara as medianas com as do baseline. Um caso regrediu se o tempo
+    atual passa do baseline por mais de `tolerancia` (fração).
+
+    Retorna: lista de (nome, tempo do baseline, tempo atual, razão) dos
+    casos presentes nos dois, e a lista dos nomes que regrediram.
+    """
+    linhas = []
+    regressoes = []
+    for nome, medicao in resultados.items():
+        anterior = baseline["resultados"].get(nome)
+        if anterior is None:
+            continue
+        razao = medicao["mediana_s"] / anterior["mediana_s"]
+        linhas.append(
+            (nome, anterior["mediana_s"], medicao["mediana_s"], razao)
+        )
+        if razao > 1.0 + tolerancia:
+            regressoes.append(nome)
+    return linhas, regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks do LBM autoral, das soluções analíticas e "
+        "da leitura do LBPM."
+    )
+    parser.add_argument("--filtro", help="mede só os casos com este trecho")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--salvar", help="grava os resultados como baseline")
+    parser.add_argument("--comparar", help="baseline para comparação")
+    parser.add_argument(
+        "--tolerancia",
+        type=float,
+        default=0.2,
+        help="aumento relativo de tempo tolerado (padrão: 0.2)",
+    )
+    args = parser.parse_args()
+
+    resultados = executar_benchmarks(args.filtro, args.repeticoes)
+    if args.salvar:
+        salvar_baseline(resultados, args.salvar)
+        print(f"Baseline gravado em {args.salvar}")
+
+    if args.comparar:
+        linhas, regressoes = comparar(
+            resultados, carregar_baseline(args.comparar), args.tolerancia
+        )
+        print("-" * 90)
+        print(
+            f"{'Caso':<45} | {'Baseline (s)':<12} | {'Atual (s)':<12} | "
+            f"{'Razão':<8}"
+        )
+        print("-" * 90)
+        for nome, anterior, atual, razao in linhas:
+            marca = "  REGRESSÃO" if nome in regressoes else ""
+            print(
+                f"{nome:<45} | {anterior:<12.6f} | {atual:<12.6f} | "
+                f"{razao:<8.2f}{marca}"
+            )
+        print("-" * 90)
+        if regressoes:
+            print(f"{len(regressoes)} caso(s) acima da tolerância.")
+            sys.exit(1)
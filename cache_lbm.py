@@ -0,0 +1,141 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Diretório e tamanho máximo padrão, sobrescrevíveis por variáveis de ambiente
+DIRETORIO_PADRAO = os.environ.get(
+    "DEPTH_AVERAGE_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "depth_average"),
+)
+LIMITE_PADRAO = int(os.environ.get("DEPTH_AVERAGE_CACHE_BYTES", 1024**3))
+
+
+class CacheResultados:
+    """
+    Cache em disco de resultados de simulação, endereçado pelo conteúdo dos
+    parâmetros: cada conjunto de parâmetros gera uma chave SHA-256 e os
+    arrays são guardados em `<chave>.npz`.
+
+    O tamanho total é limitado a `limite_bytes`; ao ultrapassá-lo, os
+    arquivos usados há mais tempo (mtime, renovado a cada acerto) são
+    removidos primeiro (LRU).
+    """
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_PADRAO):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    @staticmethod
+    def chave(parametros):
+        """Chave determinística para um dicionário de parâmetros."""
+        texto = json.dumps(parametros, sort_keys=True, default=_serializar)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.npz")
+
+    def obter(self, chave):
+        """Retorna o dicionário de arrays guardado em `chave`, ou None."""
+        caminho = self._caminho(chave)
+        try:
+            with np.load(caminho) as dados:
+                resultado = {nome: dados[nome] for nome in dados.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        # Renova a posição do arquivo na ordem LRU
+        os.utime(caminho)
+        return resultado
+
+    def guardar(self, chave, parametros=None, **arrays):
+        """Grava os arrays de forma atômica e aplica o limite de tamanho."""
+        if parametros is not None:
+            arrays["parametros"] = np.array(
+                json.dumps(parametros, sort_keys=True, default=_serializar)
+            )
+        with escrita_atomica(self._caminho(chave)) as arquivo:
+            np.savez(arquivo, **arrays)
+        self._remover_excedente()
+
+    def _remover_excedente(self):
+        entradas = []
+        for nome in os.listdir(self.diretorio):
+            if not nome.endswith(".npz"):
+                continue
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def limpar(self):
+        """Remove todas as entradas do cache."""
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".npz"):
+                os.remove(os.path.join(self.diretorio, nome))
+
+
+@contextlib.contextmanager
+def escrita_atomica(caminho, modo="wb", sincronizar=False, **opcoes):
+    """
+    Arquivo aberto para escrita que substitui `caminho` de forma atômica:
+    o conteúdo vai para um temporário no mesmo diretório, renomeado sobre
+    `caminho` (os.replace) só se o bloco terminar sem erro; senão, o
+    temporário é removido e `caminho` fica intacto. Com `sincronizar`, os
+    dados chegam ao disco (fsync) antes da troca.
+    """
+    descritor, temporario = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(caminho)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descritor, modo, **opcoes) as arquivo:
+            yield arquivo
+            if sincronizar:
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _serializar(objeto):
+    """Converte arrays e escalares NumPy para a chave em JSON."""
+    if isinstance(objeto, np.ndarray):
+        if objeto.size == 1:
+            return objeto.item()
+        conteudo = np.ascontiguousarray(objeto, dtype=np.float64)
+        return {
+            "shape": list(objeto.shape),
+            "sha256": hashlib.sha256(conteudo.tobytes()).hexdigest(),
+        }
+    if isinstance(objeto, np.generic):
+        return objeto.item()
+    raise TypeError(f"Parâmetro não serializável: {type(objeto)!r}")
+
+
+_cache_padrao = None
+
+
+def cache_padrao():
+    """Instância compartilhada do cache no diretório padrão."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheResultados()
+    return _cache_padrao
@@ -0,0 +1,315 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import cache_lbm
+import ler_vtk
+
+# Colunas fixas da tabela da campanha, na ordem de exibição. As listas do
+# .db (PorosityList, PermeabilityList) viram colunas porosity_<i> e
+# permeability_<i>, completadas com NaN, entre k_um2 e assinatura.
+COLUNAS = [
+    ("pasta", "U"),
+    ("db", "U"),
+    ("log", "U"),
+    ("status", "U"),
+    ("tau", "f8"),
+    ("Fx", "f8"),
+    ("Fy", "f8"),
+    ("Fz", "f8"),
+    ("Nx", "i8"),
+    ("Ny", "i8"),
+    ("Nz", "i8"),
+    ("h", "f8"),
+    ("k_mD", "f8"),
+    ("k_um2", "f8"),
+]
+LISTAS_DB = ("porosity", "permeability")
+
+
+def encontrar_simulacoes(raiz, threads=None):
+    """
+    Pastas de simulação sob `raiz`: as que contêm um arquivo .db do LBPM.
+
+    A árvore é percorrida nível a nível, com as pastas de cada nível
+    listadas em paralelo em um pool de `threads` threads (útil em sistemas
+    de arquivos de rede). Pastas de simulação não são exploradas por
+    dentro, o que evita listar as pastas vis* com os arquivos .vti.
+
+    Retorna: lista ordenada de (pasta, nome do .db); com mais de um .db na
+    pasta, o primeiro em ordem alfabética.
+    """
+    simulacoes = []
+    nivel = [raiz]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        while nivel:
+            proximo = []
+            for pasta, subpastas, bancos in pool.map(_listar, nivel):
+                if bancos:
+                    simulacoes.append((pasta, bancos[0]))
+                else:
+                    proximo += subpastas
+            nivel = proximo
+    return sorted(simulacoes)
+
+
+def _listar(pasta):
+    """(pasta, subpastas, arquivos .db) de uma pasta, sem seguir links."""
+    subpastas, bancos = [], []
+    try:
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    subpastas.append(entrada.path)
+                elif entrada.name.endswith(".db"):
+                    bancos.append(entrada.name)
+    except (PermissionError, FileNotFoundError):
+        pass
+    return pasta, subpastas, sorted(bancos)
+
+
+def _assinatura(*caminhos):
+    """Nome, tamanho e mtime (ns) dos arquivos, para detectar alterações."""
+    partes = []
+    for caminho in caminhos:
+        if caminho is None:
+            continue
+        info = os.stat(caminho)
+        partes.append(
+            f"{os.path.basename(caminho)}:{info.st_size}:{info.st_mtime_ns}"
+        )
+    return ";".join(partes)
+
+
+def indexar_simulacao(pasta, banco):
+    """
+    Parâmetros do .db e permeabilidade final do log de uma simulação.
+
+    O log (output_XX.log de maior XX) é lido do fim para o início (ver
+    `ler_vtk.ultima_permeabilidade_log`).
+
+    Retorna: dicionário com uma linha da tabela, sem a coluna pasta.
+    """
+    caminho_db = os.path.join(pasta, banco)
+    caminho_log = ler_vtk.log_lbpm_mais_recente(pasta)
+    registro = {
+        "db": banco,
+        "log": os.path.basename(caminho_log) if caminho_log else "",
+        "assinatura": _assinatura(caminho_db, caminho_log),
+    }
+
+    valores = ler_vtk.extract_values_from_db(caminho_db)
+    for nome in LISTAS_DB:
+        for i, valor in enumerate(valores.pop(nome, [])):
+            registro[f"{nome}_{i}"] = valor
+    registro.update(valores)
+
+    if caminho_log is None:
+        registro["status"] = "sem_log"
+        return registro
+    k_mD = ler_vtk.ultima_permeabilidade_log(caminho_log)
+    if k_mD is None:
+        registro["status"] = "sem_k"
+        return registro
+    registro.update(status="ok", k_mD=k_mD, k_um2=ler_vtk._converter_md(k_mD))
+    return registro
+
+
+def indexar_campanha(raiz, arquivo=None, threads=None):
+    """
+    Varre as simulações do LBPM sob `raiz` e grava uma tabela com uma
+    linha por simulação em `arquivo` (.npz ou .csv; padrão
+    campanha_lbpm.npz na raiz).
+
+    Se `arquivo` já existir, as simulações cujo .db e log não mudaram
+    (nome, tamanho e mtime, na coluna assinatura) são copiadas da tabela
+    anterior sem ler os arquivos; as demais, e as que falharam antes, são
+    lidas em paralelo em um pool de `threads` threads. Simulações que
+    deixaram de existir saem da tabela. Uma falha em uma simulação é
+    registrada com status "falhou" sem interromper as demais.
+
+    Retorna: a tabela (array estruturado, ordenado por pasta).
+    """
+    if arquivo is None:
+        arquivo = os.path.join(raiz, "campanha_lbpm.npz")
+    anteriores = {}
+    if os.path.exists(arquivo):
+        anteriores = {
+            linha["pasta"]: linha
+            for linha in _linhas(carregar_campanha(arquivo))
+        }
+
+    simulacoes = encontrar_simulacoes(raiz, threads)
+
+    def indexar(simulacao):
+        pasta, banco = simulacao
+        relativa = os.path.relpath(pasta, raiz)
+        anterior = anteriores.get(relativa)
+        try:
+            caminho_log = ler_vtk.log_lbpm_mais_recente(pasta)
+            assinatura = _assinatura(os.path.join(pasta, banco), caminho_log)
+            if (
+                anterior is not None
+                and anterior["status"] != "falhou"
+                and anterior["assinatura"] == assinatura
+            ):
+                return anterior, False
+            registro = indexar_simulacao(pasta, banco)
+        except Exception as e:
+            print(f"Erro em {pasta}: {type(e).__name__}: {e}")
+            registro = {"db": banco, "status": "falhou"}
+        return {"pasta": relativa, **registro}, True
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        resultados = list(pool.map(indexar, simulacoes))
+
+    lidas = sum(lida for _, lida in resultados)
+    print(
+        f"Campanha {raiz}: {len(simulacoes)} simulações, "
+        f"{len(simulacoes) - lidas} sem alterações, {lidas} lidas."
+    )
+    tabela = _montar_tabela([registro for registro, _ in resultados])
+    salvar_campanha(tabela, arquivo)
+    return tabela
+
+
+def _tipo_coluna(nome):
+    tipos = dict(COLUNAS)
+    if nome in tipos:
+        return tipos[nome]
+    return "U" if nome == "assinatura" else "f8"
+
+
+def _colunas_listas(nomes):
+    """Colunas porosity_<i> e permeability_<i> em ordem numérica."""
+    return sorted(
+        (n for n in nomes if n.rsplit("_", 1)[0] in LISTAS_DB),
+        key=lambda n: (
+            LISTAS_DB.index(n.rsplit("_", 1)[0]),
+            int(n.rsplit("_", 1)[1]),
+        ),
+    )
+
+
+def _montar_tabela(registros):
+    """Array estruturado com as COLUNAS, as colunas das listas e assinatura."""
+    registros = sorted(registros, key=lambda r: r["pasta"])
+    presentes = set().union(*registros) if registros else set()
+    nomes = (
+        [nome for nome, _ in COLUNAS]
+        + _colunas_listas(presentes)
+        + ["assinatura"]
+    )
+
+    tipos = []
+    for nome in nomes:
+        tipo = _tipo_coluna(nome)
+        if tipo == "U":
+            largura = max([len(str(r.get(nome, ""))) for r in registros] + [1])
+            tipo = f"U{largura}"
+        tipos.append((nome, tipo))
+
+    tabela = np.zeros(len(registros), dtype=tipos)
+    for n, registro in enumerate(registros):
+        for nome, tipo in tipos:
+            if tipo.startswith("U"):
+                padrao = ""
+            else:
+                padrao = -1 if tipo == "i8" else np.nan
+            tabela[nome][n] = registro.get(nome, padrao)
+    return tabela
+
+
+def _linhas(tabela):
+    """Linhas da tabela como dicionários, sem as colunas vazias."""
+    linhas = []
+    for linha in tabela:
+        registro = {}
+        for nome in tabela.dtype.names:
+            valor = linha[nome].item()
+            if valor == "" or (valor == -1 and nome in ("Nx", "Ny", "Nz")):
+                continue
+            if isinstance(valor, float) and np.isnan(valor):
+                continue
+            registro[nome] = valor
+        linhas.append(registro)
+    return linhas
+
+
+def salvar_campanha(tabela, caminho):
+    """
+    Grava a tabela em .csv ou .npz (um array por coluna), de forma
+    atômica (ver `cache_lbm.escrita_atomica`).
+    """
+    if caminho.endswith(".csv"):
+        with cache_lbm.escrita_atomica(
+            caminho, "w", newline="", encoding="utf-8"
+        ) as f:
+            escritor = csv.writer(f)
+            escritor.writerow(tabela.dtype.names)
+            for linha in tabela:
+                escritor.writerow(
+                    [
+                        f"{v:.10g}" if isinstance(v, float) else v
+                        for v in linha.tolist()
+                    ]
+                )
+        return
+    with cache_lbm.escrita_atomica(caminho) as f:
+        np.savez(f, **{nome: tabela[nome] for nome in tabela.dtype.names})
+
+
+def carregar_campanha(caminho):
+    """Lê uma tabela gravada por `salvar_campanha` (.csv ou .npz)."""
+    if caminho.endswith(".csv"):
+        with open(caminho, newline="", encoding="utf-8") as f:
+            registros = []
+            for linha in csv.DictReader(f):
+                registro = {}
+                for nome, texto in linha.items():
+                    tipo = _tipo_coluna(nome)
+                    if tipo != "U" and texto != "":
+                        texto = int(texto) if tipo == "i8" else float(texto)
+                    registro[nome] = texto
+                registros.append(registro)
+        return _montar_tabela(registros)
+    with np.load(caminho) as dados:
+        colunas = {nome: dados[nome] for nome in dados.files}
+    tabela = np.zeros(
+        len(colunas["pasta"]),
+        dtype=[(nome, colunas[nome].dtype) for nome in colunas],
+    )
+    for nome, valores in colunas.items():
+        tabela[nome] = valores
+    return tabela
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Tabela de resultados de uma campanha de simulações "
+        "do LBPM."
+    )
+    parser.add_argument("raiz", help="pasta com as simulações")
+    parser.add_argument(
+        "--saida", help="tabela .npz ou .csv (padrão: raiz/campanha_lbpm.npz)"
+    )
+    parser.add_argument("--threads", type=int)
+    args = parser.parse_args()
+
+    tabela = indexar_campanha(args.raiz, args.saida, args.threads)
+
+    print("-" * 100)
+    print(
+        f"{'Pasta':<40} | {'tau':<8} | {'Nx':<5} | {'h':<8} | "
+        f"{'k (mD)':<12} | {'Status':<8}"
+    )
+    print("-" * 100)
+    for linha in tabela:
+        print(
+            f"{linha['pasta']:<40} | {linha['tau']:<8.4f} | {linha['Nx']:<5d} | "
+            f"{linha['h']:<8.4g} | {linha['k_mD']:<12.6g} | {linha['status']:<8}"
+        )
+    print("-" * 100)
@@ -1,5 +1,369 @@
+import copy
+import json
+import os
+import time
 import numpy as np
 import matplotlib.pyplot as plt
+import analitico_2d_depth
+import cache_lbm
+
+# Compilação JIT opcional: sem numba, o motor "numba" recai no vetorizado
+try:
+    import numba
+except ImportError:
+    numba = None
+
+prange = numba.prange if numba is not None else range
+
+# Versão numérica do solver, parte da chave do cache de resultados: deve ser
+# incrementada sempre que uma mudança alterar os valores de (rho, u, v)
+VERSAO_SOLVER = 2
+
+# D2Q9: velocidades discretas, pesos e direções opostas
+E = np.array(
+    [
+        [0, 0],
+        [1, 0],
+        [-1, 0],
+        [0, 1],
+        [0, -1],
+        [1, 1],
+        [-1, -1],
+        [1, -1],
+        [-1, 1],
+    ]
+)
+W = np.array(
+    [4 / 9, 1 / 9, 1 / 9, 1 / 9, 1 / 9, 1 / 36, 1 / 36, 1 / 36, 1 / 36]
+)
+OPOSTOS = np.array([0, 2, 1, 4, 3, 6, 5, 8, 7])
+
+# Formatos de armazenamento das populações: (dtype, guarda f - w). Em
+# "float32_desvio" o float32 guarda f - w, o desvio em relação aos pesos,
+# que preserva os dígitos significativos perto de rho = 1; momentos,
+# colisão e critério de parada são sempre calculados em float64. Erro
+# relativo da permeabilidade em relação ao float64, nos dutos de
+# resultados.py (tau = 0.9330127, g = 1e-8, motor numba):
+#
+#     caso (Ny x h)   float32     float32_desvio
+#     24 x 24         2.0e-02     3.3e-06
+#     80 x 8          1.3e-01     6.4e-07
+#     80 x 80         5.6e-03     3.3e-05
+#
+# Sem o desvio, as perturbações de f causadas pelo escoamento se perdem no
+# arredondamento de float32 em torno de w; float32 puro serve apenas para
+# testes rápidos.
+PRECISOES = {
+    "float64": (np.float64, 0.0),
+    "float32": (np.float32, 0.0),
+    "float32_desvio": (np.float32, 1.0),
+}
+
+
+def imprimir_progresso(timestep, erro):
+    """Callback padrão de `Convergencia`: uma linha reescrita no console."""
+    print(f"timestep {timestep}: erro = {erro:.1e}", end="\r")
+
+
+class Convergencia:
+    """
+    Política de parada de `halfway`.
+
+    criterio: "soma" (variação relativa de sum |u|, o critério original),
+    "l2" ou "linf" (resíduo relativo do campo de velocidade em relação à
+    verificação anterior) ou "permeabilidade" (variação relativa da
+    velocidade média em x, proporcional à permeabilidade).
+    intervalo: número de passos entre verificações.
+    max_passos, tempo_max: limites de passos e de tempo de parede [s].
+    callback: função callback(timestep, erro) chamada a cada verificação
+    no lugar do print; None desativa a saída, inclusive a linha de MLUPS
+    impressa ao final (ver `Instrumentacao`).
+
+    Após a execução, `motivo` indica por que a simulação parou
+    ("convergiu", "max_passos", "tempo_max" ou "divergiu") e `historico`
+    guarda os pares (timestep, erro) de cada verificação.
+    """
+
+    CRITERIOS = ("soma", "l2", "linf", "permeabilidade")
+
+    def __init__(
+        self,
+        tolerancia=1e-10,
+        criterio="soma",
+        intervalo=1,
+        max_passos=None,
+        tempo_max=None,
+        callback=imprimir_progresso,
+    ):
+        if criterio not in self.CRITERIOS:
+            raise ValueError(
+                f"Critério '{criterio}' desconhecido. "
+                f"Opções: {', '.join(self.CRITERIOS)}"
+            )
+        if intervalo < 1:
+            raise ValueError("O intervalo de verificação deve ser >= 1.")
+        self.tolerancia = tolerancia
+        self.criterio = criterio
+        self.intervalo = int(intervalo)
+        self.max_passos = max_passos
+        self.tempo_max = tempo_max
+        self.callback = callback
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta o estado de uma execução anterior."""
+        self.historico = []
+        self.motivo = None
+        self._anterior = None
+        self._t0 = time.perf_counter()
+        # colunas idênticas representadas por cada coluna no modo reduzido
+        self.replicas_x = 1
+
+    def deve_verificar(self, timestep):
+        """Indica se o passo `timestep` deve passar por `verificar`."""
+        if self.max_passos is not None and timestep >= self.max_passos:
+            return True
+        return timestep % self.intervalo == 0
+
+    def verificar(self, timestep, u, v):
+        """Avalia o resíduo em (u, v) e retorna True se a execução deve parar."""
+        if self.replicas_x > 1:
+            u = np.repeat(np.reshape(u, (-1, 1)), self.replicas_x, axis=1)
+            v = np.repeat(np.reshape(v, (-1, 1)), self.replicas_x, axis=1)
+        erro = self._residuo(u, v)
+        self.historico.append((timestep, erro))
+        if self.callback is not None:
+            self.callback(timestep, erro)
+
+        if np.isnan(erro):
+            self.motivo = "divergiu"
+        elif erro <= self.tolerancia:
+            self.motivo = "convergiu"
+        elif self.max_passos is not None and timestep >= self.max_passos:
+            self.motivo = "max_passos"
+        elif (
+            self.tempo_max is not None
+            and time.perf_counter() - self._t0 >= self.tempo_max
+        ):
+            self.motivo = "tempo_max"
+        return self.motivo is not None
+
+    def estado(self):
+        """Histórico e referência do resíduo, para gravar em um checkpoint."""
+        historico = np.array(self.historico, dtype=np.float64).reshape(-1, 2)
+        if self._anterior is None:
+            anterior = np.empty(0)
+        else:
+            anterior = np.array(self._anterior, dtype=np.float64)
+        return {"historico": historico, "anterior": anterior}
+
+    def restaurar(self, historico, anterior):
+        """Recupera o estado gravado por `estado`."""
+        self.historico = [(int(t), float(erro)) for t, erro in historico]
+        if anterior.shape == (0,):
+            self._anterior = None
+        elif anterior.ndim == 0:
+            self._anterior = anterior[()]
+        else:
+            self._anterior = (anterior[0], anterior[1])
+
+    def _residuo(self, u, v):
+        if self.criterio in ("soma", "permeabilidade"):
+            if self.criterio == "soma":
+                atual = np.sum(np.sqrt(u**2 + v**2), dtype=np.float64)
+            else:
+                atual = np.mean(u, dtype=np.float64)
+            anterior = self._anterior
+            self._anterior = atual
+            if anterior is None:
+                return np.inf
+            return _relativo(abs(atual - anterior), abs(atual))
+
+        u = np.asarray(u, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float64)
+        anterior = self._anterior
+        self._anterior = (u.copy(), v.copy())
+        if anterior is None:
+            return np.inf
+        du = u - anterior[0]
+        dv = v - anterior[1]
+        if self.criterio == "l2":
+            return _relativo(
+                np.sqrt(np.sum(du**2 + dv**2)), np.sqrt(np.sum(u**2 + v**2))
+            )
+        return _relativo(
+            np.max(np.sqrt(du**2 + dv**2)), np.max(np.sqrt(u**2 + v**2))
+        )
+
+
+class Checkpoint:
+    """
+    Pontos de reinício periódicos de `halfway`.
+
+    A cada `intervalo` passos, as populações (no formato de armazenamento
+    do motor), o passo de tempo e o estado de `Convergencia` são gravados
+    de forma atômica em `caminho` (.npz). Se o arquivo já existir ao
+    iniciar, a execução é retomada a partir dele e segue bit a bit como
+    seguiria sem a interrupção. O checkpoint guarda a chave dos parâmetros
+    do caso (físicos, motor, modo de armazenamento e critério), e retomar
+    um caso diferente gera erro.
+
+    Ao parar por `tempo_max` o estado também é gravado, de modo que um
+    trabalho longo pode ser dividido em execuções curtas na fila, todas
+    com a mesma chamada; `tempo_max` conta a partir de cada retomada. Ao
+    convergir ou atingir `max_passos` o arquivo é removido (use
+    `halfway_em_cache` para guardar o resultado convergido).
+    """
+
+    def __init__(self, caminho, intervalo=1000):
+        if intervalo < 1:
+            raise ValueError("O intervalo de checkpoint deve ser >= 1.")
+        self.caminho = caminho
+        self.intervalo = int(intervalo)
+        self._chave = None
+
+    def associar(self, parametros):
+        """Define os parâmetros do caso, conferidos ao retomar."""
+        self._chave = cache_lbm.CacheResultados.chave(parametros)
+
+    def deve_salvar(self, timestep):
+        return timestep % self.intervalo == 0
+
+    def retomar(self, f, convergencia):
+        """
+        Copia para `f` as populações do checkpoint, se existir, e restaura
+        `convergencia`.
+
+        Retorna: o passo de tempo do checkpoint (0 se não houver).
+        """
+        try:
+            dados = np.load(self.caminho)
+        except FileNotFoundError:
+            return 0
+        with dados:
+            if str(dados["chave"]) != self._chave:
+                raise ValueError(
+                    f"O checkpoint {self.caminho} é de outro caso "
+                    "(parâmetros, motor ou precisão diferentes)."
+                )
+            if dados["f"].shape != f.shape or dados["f"].dtype != f.dtype:
+                raise ValueError(
+                    f"Populações do checkpoint {self.caminho} incompatíveis."
+                )
+            np.copyto(f, dados["f"])
+            convergencia.restaurar(dados["historico"], dados["anterior"])
+            return int(dados["timestep"])
+
+    def salvar(self, timestep, f, convergencia):
+        """Grava o estado de forma atômica (ver `cache_lbm.escrita_atomica`)."""
+        with cache_lbm.escrita_atomica(
+            self.caminho, sincronizar=True
+        ) as arquivo:
+            np.savez(
+                arquivo,
+                chave=np.array(self._chave),
+                timestep=np.array(timestep),
+                f=f,
+                **convergencia.estado(),
+            )
+
+    def finalizar(self, timestep, f, convergencia):
+        """Grava ou descarta o checkpoint conforme o motivo da parada."""
+        if convergencia.motivo == "tempo_max":
+            self.salvar(timestep, f, convergencia)
+        elif convergencia.motivo in ("convergiu", "max_passos"):
+            if os.path.exists(self.caminho):
+                os.remove(self.caminho)
+
+
+class Instrumentacao:
+    """
+    Medições de desempenho de uma execução de `halfway`.
+
+    O laço de tempo é dividido em fases, cada uma com o tempo de parede
+    acumulado: "colisao" (momentos e colisão), "propagacao", "contorno"
+    (paredes e nós sólidos), "convergencia" e "checkpoint". Fases fundidas
+    em um motor aparecem juntas: no laço, as paredes entram em
+    "propagacao"; no numba, o kernel inteiro é "colisao_propagacao"; no
+    multiprocesso, o processo principal só mede a espera pelo "passo" das
+    faixas.
+
+    destino: None, o caminho de um arquivo JSON lines (um registro anexado
+    por execução) ou uma função destino(relatorio). O desempenho (MLUPS)
+    também é impresso ao final, a menos que o callback da `Convergencia`
+    seja None.
+
+    Após a execução, `relatorio` é um dicionário com motor, nx, ny, passos
+    (executados nesta chamada), passo_final, motivo da parada, tempo_s,
+    mlups, fases {nome: segundos} e memoria_populacoes (pico, em bytes,
+    dos arrays de populações, incluindo as cópias de trabalho).
+    """
+
+    def __init__(self, destino=None):
+        self.destino = destino
+        self.relatorio = None
+
+    def iniciar(self, motor, nx, ny, timestep=0):
+        """Zera as medições; chamado pelo motor logo antes do laço."""
+        self.motor = motor
+        self.nx = nx
+        self.ny = ny
+        self.fases = {}
+        self.memoria_populacoes = 0
+        self._passo_inicial = timestep
+        self._t0 = self._marca = time.perf_counter()
+
+    def registrar_populacoes(self, nbytes):
+        """Soma `nbytes` de arrays de populações ao pico de memória."""
+        self.memoria_populacoes += int(nbytes)
+
+    def marcar(self, fase):
+        """Atribui a `fase` o tempo decorrido desde a marca anterior."""
+        agora = time.perf_counter()
+        self.fases[fase] = self.fases.get(fase, 0.0) + agora - self._marca
+        self._marca = agora
+
+    def finalizar(self, timestep, convergencia, atualizacoes=None):
+        """
+        Monta o relatório e o envia ao destino. `atualizacoes` é o total
+        de nós atualizados, quando não é nx * ny por passo (lotes).
+        """
+        # o trecho desde a última marca é a verificação que encerrou o laço
+        self.marcar("convergencia")
+        duracao = time.perf_counter() - self._t0
+        passos = timestep - self._passo_inicial
+        if atualizacoes is None:
+            atualizacoes = self.nx * self.ny * passos
+        self.relatorio = {
+            "motor": self.motor,
+            "nx": int(self.nx),
+            "ny": int(self.ny),
+            "passos": int(passos),
+            "passo_final": int(timestep),
+            "motivo": convergencia.motivo,
+            "tempo_s": duracao,
+            "mlups": atualizacoes / duracao / 1e6 if duracao > 0 else 0.0,
+            "fases": dict(self.fases),
+            "memoria_populacoes": int(self.memoria_populacoes),
+        }
+        if convergencia.callback is not None:
+            # a saída no console segue a de Convergencia
+            print(
+                f"\n[{self.motor}] {passos} passos em {duracao:.2f} s: "
+                f"{self.relatorio['mlups']:.2f} MLUPS"
+            )
+        if callable(self.destino):
+            self.destino(self.relatorio)
+        elif self.destino is not None:
+            with open(self.destino, "a", encoding="utf-8") as arquivo:
+                arquivo.write(json.dumps(self.relatorio) + "\n")
+        return self.relatorio
+
+
+def _relativo(diferenca, referencia):
+    if referencia == 0:
+        return 0.0 if diferenca == 0 else np.inf
+    return diferenca / referencia
 
 
 def oposto(k):
@@ -8,13 +372,257 @@ def oposto(k):
     return opostos[k]
 
 
-def halfway(tau, nx, ny, G, depth_value):
+def halfway(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    motor="laco",
+    buffer_unico=False,
+    convergencia=None,
+    inicializacao=None,
+    precisao="float64",
+    checkpoint=None,
+    instrumentacao=None,
+    reduzido=None,
+    niveis=1,
+):
+    """
+    Resolve o escoamento em média na profundidade (2.5D) com paredes
+    halfway bounce-back em j = 0 e j = ny - 1 e periodicidade em x.
+
+    `depth_value` é a abertura: um escalar ou um mapa por nó, com shape
+    (ny, nx) ou achatado em i + nx * j. Nós de abertura zero são sólidos.
+
+    `motor` seleciona a implementação: "laco" (laços explícitos por nó),
+    "vetorizado" (operações sobre o reticulado inteiro em NumPy) ou "numba"
+    (kernel compilado que funde colisão e propagação e paraleliza nas
+    linhas; recai no vetorizado se o numba não estiver instalado) ou
+    "multiprocesso" (vetorizado com o reticulado dividido em faixas ao longo
+    de x entre processos, em memória compartilhada; ver lbm_multiprocesso).
+
+    `buffer_unico` mantém um único array de populações, propagado no lugar
+    (troca por pares no vetorizado, padrão AA no numba), sem alocações por
+    passo de tempo.
+
+    `convergencia`, `checkpoint` e `instrumentacao` são instâncias de
+    `Convergencia` (padrão: variação relativa de sum |u| abaixo de 1e-10,
+    verificada a cada passo), `Checkpoint` e `Instrumentacao`.
+
+    `inicializacao` define as populações iniciais: None (fluido em
+    repouso), "analitico" ou um par (u, v) de campos (ver
+    `_populacoes_iniciais`).
+
+    `precisao` é uma das chaves de PRECISOES, o formato de armazenamento
+    das populações (motores vetorizado, sem buffer_unico, e numba).
+
+    `reduzido` controla o modo de uma coluna, quando nada varia em x (ver
+    `_coluna_invariante`): None detecta a invariância, True a exige e
+    False desativa o modo.
+
+    `niveis` > 1 inicializa a solução a partir de reticulados mais grossos
+    (ver `halfway_multinivel`). Com `tau` em um array 1D, a chamada
+    resolve um lote de reticulados independentes (ver `halfway_lote`),
+    ignorando `motor`.
+
+    Retorna: (rho, u, v) em arrays 1D indexados por i + nx * j.
+    """
+    if motor not in MOTORES:
+        raise ValueError(
+            f"Motor '{motor}' desconhecido. Opções: {', '.join(MOTORES)}"
+        )
+    if np.ndim(tau) > 0:
+        if buffer_unico or precisao != "float64" or checkpoint is not None:
+            raise ValueError(
+                "Lotes não suportam buffer_unico, precisão reduzida nem "
+                "checkpoint"
+            )
+        return halfway_lote(
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            convergencia=convergencia,
+            inicializacao=inicializacao,
+            instrumentacao=instrumentacao,
+        )
+    if niveis > 1:
+        return halfway_multinivel(
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            niveis=niveis,
+            motor=motor,
+            buffer_unico=buffer_unico,
+            convergencia=convergencia,
+            inicializacao=inicializacao,
+            precisao=precisao,
+            checkpoint=checkpoint,
+            instrumentacao=instrumentacao,
+            reduzido=reduzido,
+        )
+    if convergencia is None:
+        convergencia = Convergencia()
+    convergencia.reiniciar()
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
+
+    if precisao not in PRECISOES:
+        raise ValueError(
+            f"Precisão '{precisao}' desconhecida. "
+            f"Opções: {', '.join(PRECISOES)}"
+        )
+    if precisao != "float64" and (
+        motor == "laco" or (motor == "vetorizado" and buffer_unico)
+    ):
+        raise ValueError(
+            "Precisão reduzida disponível apenas no motor numba e no "
+            "vetorizado sem buffer_unico"
+        )
+
+    # modo de uma coluna para geometrias invariantes em x
+    nx_total = nx
+    if reduzido is not False and nx > 1:
+        coluna = _coluna_invariante(depth_value, nx, ny, inicializacao)
+        if coluna is None and reduzido:
+            raise ValueError(
+                "reduzido=True exige abertura e inicialização invariantes "
+                "em x"
+            )
+        if coluna is not None:
+            depth_value, inicializacao = coluna
+            nx = 1
+            convergencia.replicas_x = nx_total
+
+    if checkpoint is not None:
+        checkpoint.associar(
+            {
+                "versao": VERSAO_SOLVER,
+                "tau": float(tau),
+                "nx": int(nx_total),
+                "ny": int(ny),
+                "G": [float(g) for g in G],
+                "abertura": np.asarray(depth_value, dtype=float),
+                # sem numba, o motor numba grava no formato do vetorizado
+                "motor": (
+                    "vetorizado"
+                    if motor == "numba" and numba is None
+                    else motor
+                ),
+                "buffer_unico": bool(buffer_unico),
+                "precisao": precisao,
+                "criterio": convergencia.criterio,
+                "intervalo": convergencia.intervalo,
+                "colunas": int(nx),
+            }
+        )
+
+    if motor == "laco":
+        if buffer_unico:
+            raise ValueError(
+                "buffer_unico disponível apenas nos motores vetorizado e numba"
+            )
+        resultado = _halfway_laco(
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            convergencia,
+            inicializacao,
+            checkpoint,
+            instrumentacao,
+        )
+    else:
+        resultado = MOTORES[motor](
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            buffer_unico=buffer_unico,
+            convergencia=convergencia,
+            inicializacao=inicializacao,
+            precisao=precisao,
+            checkpoint=checkpoint,
+            instrumentacao=instrumentacao,
+        )
+    if nx == nx_total:
+        return resultado
+    return tuple(
+        np.repeat(np.reshape(campo, (ny, 1)), nx_total, axis=1).ravel()
+        for campo in resultado
+    )
+
+
+def _coluna_invariante(depth_value, nx, ny, inicializacao):
+    """
+    Se a abertura e o campo inicial não variam em x, retorna a abertura
+    (escalar ou coluna (ny, 1)) e a inicialização de uma única coluna;
+    senão, None.
+
+    Nesse caso o escoamento também não varia em x, e basta avançar uma
+    única coluna de populações (nx = 1, em que a propagação periódica em x
+    é a identidade). `halfway` replica o resultado nas nx colunas e avalia
+    o critério de parada sobre o campo replicado, o que reproduz bit a bit
+    a execução completa.
+    """
+    abertura = np.asarray(depth_value, dtype=float)
+    if abertura.ndim > 0:
+        if abertura.size != nx * ny:
+            return None
+        abertura = abertura.reshape(ny, nx)
+        if not np.all(abertura == abertura[:, :1]):
+            return None
+        abertura = abertura[:, :1].copy()
+
+    if inicializacao is None or isinstance(inicializacao, str):
+        return abertura, inicializacao
+    colunas = []
+    for campo in inicializacao:
+        campo = np.asarray(campo, dtype=float)
+        if campo.size != nx * ny:
+            return None
+        campo = campo.reshape(ny, nx)
+        if not np.all(campo == campo[:, :1]):
+            return None
+        colunas.append(campo[:, :1].copy())
+    return abertura, tuple(colunas)
+
+
+def _halfway_laco(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    convergencia,
+    inicializacao=None,
+    checkpoint=None,
+    instrumentacao=None,
+):
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
 
     dt = 1.0
     c2 = 1.0 / 3.0
     nu = (tau - 0.5) * c2 * dt
 
-    depth_map = np.full(nx * ny, depth_value)
+    coeficientes = _coeficientes_abertura(depth_value, nx, ny, nu, G, dt)
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = coeficientes
+    if solido.any():
+        raise ValueError(
+            "Nós sólidos (abertura zero) exigem o motor vetorizado ou numba"
+        )
+    depth_map = depth_map.ravel()
+    denominador = denominador.ravel()
+    arrasto = arrasto.ravel()
+    forca_x = forca_x.ravel()
+    forca_y = forca_y.ravel()
 
     e = np.array(
         [
@@ -41,18 +649,23 @@ def halfway(tau, nx, ny, G, depth_value):
     f_old = np.zeros(9 * nx * ny)
 
     # inicialização
+    f_inicial = _populacoes_iniciais(
+        inicializacao, tau, nx, ny, G, depth_value, coeficientes
+    )
+    timestep = 0
+    if checkpoint is not None:
+        timestep = checkpoint.retomar(f_inicial, convergencia)
     for i in range(nx):
         for j in range(ny):
-            idx_node = i + nx * j
             for k in range(9):
                 idx_f = k + 9 * i + 9 * nx * j
-                f_old[idx_f] = w[k] * rho[idx_node]
+                f_old[idx_f] = f_inicial[k, j, i]
 
-    erro = 10e10
-    anterior = 10e10
-    timestep = 0
+    instrumentacao.iniciar("laco", nx, ny, timestep)
+    # f_old, f_new, f_intermed e a cópia de f_new para f_old
+    instrumentacao.registrar_populacoes(4 * f_old.nbytes)
 
-    while erro > 1e-10:
+    while True:
         f_new = np.zeros(9 * nx * ny)
 
         for i in range(nx):
@@ -72,13 +685,12 @@ def halfway(tau, nx, ny, G, depth_value):
                 depth_local = depth_map[idx_node]
 
                 # cálculo das velocidades
-                denominador = 1.0 + (6.0 * dt * nu) / (depth_local**2)
                 uh_local = (
-                    sum_f_ex + 0.5 * dt * depth_local * G[0]
-                ) / denominador
+                    sum_f_ex + 0.5 * dt * forca_x[idx_node]
+                ) / denominador[idx_node]
                 vh_local = (
-                    sum_f_ey + 0.5 * dt * depth_local * G[1]
-                ) / denominador
+                    sum_f_ey + 0.5 * dt * forca_y[idx_node]
+                ) / denominador[idx_node]
 
                 uh[idx_node] = uh_local
                 vh[idx_node] = vh_local
@@ -89,12 +701,8 @@ def halfway(tau, nx, ny, G, depth_value):
                 rho[idx_node] = rho_temp
 
                 # termo de força
-                Fx = (
-                    depth_local * G[0] - (12.0 * nu / depth_local**2) * uh_local
-                )
-                Fy = (
-                    depth_local * G[1] - (12.0 * nu / depth_local**2) * vh_local
-                )
+                Fx = forca_x[idx_node] - arrasto[idx_node] * uh_local
+                Fy = forca_y[idx_node] - arrasto[idx_node] * vh_local
 
                 uu = uh_local**2 + vh_local**2
 
@@ -118,6 +726,7 @@ def halfway(tau, nx, ny, G, depth_value):
                         + dt * Fi
                     )
 
+        instrumentacao.marcar("colisao")
         f_intermed = f_new.copy()
 
         # propagação
@@ -130,7 +739,7 @@ def halfway(tau, nx, ny, G, depth_value):
                         j_next = (j + e[k, 1]) % ny
                         idx_orig = k + 9 * i + 9 * nx * j
                         idx_dest = k + 9 * i_next + 9 * nx * j_next
-                        f_new[idx_dest] = f_new[idx_orig]
+                        f_new[idx_dest] = f_intermed[idx_orig]
                     for k in [4, 6, 7]:
                         idx_orig = k + 9 * i + 9 * nx * j
                         idx_dest = oposto(k) + 9 * i + 9 * nx * j
@@ -142,7 +751,7 @@ def halfway(tau, nx, ny, G, depth_value):
                         j_next = (j + e[k, 1]) % ny
                         idx_orig = k + 9 * i + 9 * nx * j
                         idx_dest = k + 9 * i_next + 9 * nx * j_next
-                        f_new[idx_dest] = f_new[idx_orig]
+                        f_new[idx_dest] = f_intermed[idx_orig]
                     for k in [3, 5, 8]:
                         idx_orig = k + 9 * i + 9 * nx * j
                         idx_dest = oposto(k) + 9 * i + 9 * nx * j
@@ -158,35 +767,1219 @@ def halfway(tau, nx, ny, G, depth_value):
                         f_new[idx_dest] = f_intermed[idx_orig]
 
         f_old = f_new.copy()
+        instrumentacao.marcar("propagacao")
+
+        # erro
+        timestep += 1
+        if convergencia.deve_verificar(timestep) and convergencia.verificar(
+            timestep, u, v
+        ):
+            break
+        instrumentacao.marcar("convergencia")
+        if checkpoint is not None and checkpoint.deve_salvar(timestep):
+            checkpoint.salvar(
+                timestep,
+                f_old.reshape(ny, nx, 9).transpose(2, 0, 1),
+                convergencia,
+            )
+            instrumentacao.marcar("checkpoint")
+
+    instrumentacao.finalizar(timestep, convergencia)
+    if checkpoint is not None:
+        checkpoint.finalizar(
+            timestep, f_old.reshape(ny, nx, 9).transpose(2, 0, 1), convergencia
+        )
+    return rho, u, v
+
+
+def carregar_abertura(caminho, nx=None, ny=None, dtype="<f8"):
+    """
+    Lê um mapa de abertura 2D (ny, nx) de um arquivo .npy ou binário bruto.
+    Para arquivos brutos, `nx`, `ny` e `dtype` descrevem o conteúdo.
+    """
+    if caminho.endswith(".npy"):
+        abertura = np.load(caminho)
+    else:
+        if nx is None or ny is None:
+            raise ValueError("Arquivos brutos exigem nx e ny.")
+        abertura = np.fromfile(caminho, dtype=dtype).reshape(ny, nx)
+    return abertura.astype(float)
+
+
+def _coeficientes_abertura(depth_value, nx, ny, nu, G, dt=1.0):
+    """
+    Pré-calcula, uma única vez, os coeficientes por nó que dependem da
+    abertura: denominador da velocidade, arrasto 12 nu / h² e força h G.
+    Nós sólidos (abertura zero) recebem abertura fictícia 1 e força nula,
+    o que mantém u = v = 0 sem divisões por zero.
+
+    Retorna: (depth_map, solido, denominador, arrasto, forca_x, forca_y),
+    todos com shape (ny, nx).
+    """
+    depth_map = np.asarray(depth_value, dtype=float)
+    if depth_map.ndim == 0:
+        depth_map = np.full((ny, nx), float(depth_map))
+    elif depth_map.size == nx * ny:
+        depth_map = depth_map.reshape(ny, nx).copy()
+    else:
+        raise ValueError(
+            f"Mapa de abertura com shape {depth_map.shape} incompatível com "
+            f"(ny, nx) = ({ny}, {nx})"
+        )
+    if np.any(depth_map < 0) or not np.all(np.isfinite(depth_map)):
+        raise ValueError("A abertura deve ser finita e não negativa.")
+
+    solido = depth_map == 0
+    depth_map[solido] = 1.0
+    denominador = 1.0 + (6.0 * dt * nu) / depth_map**2
+    arrasto = 12.0 * nu / depth_map**2
+    forca_x = np.where(solido, 0.0, depth_map * G[0])
+    forca_y = np.where(solido, 0.0, depth_map * G[1])
+
+    return depth_map, solido, denominador, arrasto, forca_x, forca_y
+
+
+def _velocidade_inicial(inicializacao, tau, nx, ny, G, depth_value):
+    """Campos (u, v) com shape (ny, nx) pedidos em `inicializacao`."""
+    if isinstance(inicializacao, str):
+        if inicializacao != "analitico":
+            raise ValueError(
+                f"Inicialização '{inicializacao}' desconhecida. "
+                "Opções: None, 'analitico' ou um par (u, v)"
+            )
+        if np.ndim(depth_value) != 0:
+            raise ValueError(
+                "A inicialização analítica exige abertura uniforme."
+            )
+        # paredes halfway em y = 0 e y = ny, nós nos centros das células
+        y = np.arange(ny) + 0.5
+        perfil = analitico_2d_depth.perfil_velocidade_analitico_2d_depth(
+            tau, ny, G[0], float(depth_value), y=y
+        )
+        u = np.broadcast_to(perfil[:, None], (ny, nx))
+        return u, np.zeros((ny, nx))
+
+    u, v = inicializacao
+    return (
+        np.asarray(u, dtype=float).reshape(ny, nx),
+        np.asarray(v, dtype=float).reshape(ny, nx),
+    )
+
+
+def _populacoes_iniciais(
+    inicializacao, tau, nx, ny, G, depth_value, coeficientes
+):
+    """
+    Populações iniciais (9, ny, nx). `inicializacao` é None (fluido em
+    repouso), "analitico" (perfil analítico em média na profundidade nos
+    centros das células; exige abertura uniforme) ou um par (u, v) de
+    campos, por exemplo o resultado de uma execução anterior.
+
+    Com um campo de velocidade, usa f = f_eq(1, uh) - F_i / 2, de modo que
+    o momento corrigido pela força (o mesmo calculado a cada passo)
+    reproduz exatamente uh = h u.
+    """
+    f = W[:, None, None] * np.ones((ny, nx))
+    if inicializacao is None:
+        return f
+
+    depth_map, solido, _, arrasto, forca_x, forca_y = coeficientes
+    u, v = _velocidade_inicial(inicializacao, tau, nx, ny, G, depth_value)
+    uh = np.where(solido, 0.0, u * depth_map)
+    vh = np.where(solido, 0.0, v * depth_map)
+    Fx = forca_x - arrasto * uh
+    Fy = forca_y - arrasto * vh
+
+    ex = E[:, 0, None, None]
+    ey = E[:, 1, None, None]
+    w = W[:, None, None]
+    uu = uh**2 + vh**2
+    eu = ex * uh + ey * vh
+    eF = ex * Fx + ey * Fy
+    uF = uh * Fx + vh * Fy
+    f_eq = w * (1.0 + 3.0 * eu + 4.5 * eu**2 - 1.5 * uu)
+    Fi = w * (3.0 * (eF - uF) + 9.0 * eu * eF)
+
+    # parte de não-equilíbrio de primeira ordem (Chapman-Enskog)
+    duh_dx, duh_dy = _gradiente(uh, solido)
+    dvh_dx, dvh_dy = _gradiente(vh, solido)
+    Q_grad = (
+        (ex * ex - 1.0 / 3.0) * duh_dx
+        + ex * ey * (duh_dy + dvh_dx)
+        + (ey * ey - 1.0 / 3.0) * dvh_dy
+    )
+    f_neq = -3.0 * tau * w * Q_grad
+
+    f = f_eq + f_neq - 0.5 * Fi
+    np.copyto(f, w, where=solido)
+    return f
+
+
+def _gradiente(campo, solido):
+    """
+    Derivadas centradas (d/dx, d/dy) de um campo (ny, nx), periódico em x.
+    Paredes e sólidos ficam a meia célula, com velocidade nula: o vizinho
+    ausente é a reflexão ímpar do próprio nó.
+    """
+    campo = np.where(solido, 0.0, campo)
+    ny = campo.shape[0]
+    vizinhos = []
+    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        vizinho = np.roll(campo, (-dy, -dx), axis=(0, 1))
+        parede = np.roll(solido, (-dy, -dx), axis=(0, 1))
+        if dy == 1:
+            parede[ny - 1, :] = True
+        elif dy == -1:
+            parede[0, :] = True
+        vizinhos.append(np.where(parede, -campo, vizinho))
+    return (
+        0.5 * (vizinhos[0] - vizinhos[1]),
+        0.5 * (vizinhos[2] - vizinhos[3]),
+    )
+
+
+def _mascaras_rebate(nx, ny, solido=None):
+    """
+    Máscaras (9, ny, nx) que marcam, para cada direção k, os nós cuja
+    população f_k viria de uma parede (fora do canal) ou de um nó sólido e
+    portanto é obtida por bounce-back da direção oposta no próprio nó.
+    """
+    j_origem = np.arange(ny)[None, :] - E[:, 1][:, None]
+    fora = (j_origem < 0) | (j_origem > ny - 1)
+    rebate = np.broadcast_to(fora[:, :, None], (9, ny, nx)).copy()
+    if solido is not None:
+        for k in range(1, 9):
+            rebate[k] |= np.roll(solido, (E[k, 1], E[k, 0]), axis=(0, 1))
+    return rebate
+
+
+def _halfway_vetorizado(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    buffer_unico=False,
+    convergencia=None,
+    inicializacao=None,
+    precisao="float64",
+    checkpoint=None,
+    instrumentacao=None,
+):
+    if convergencia is None:
+        convergencia = Convergencia()
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
+    if buffer_unico:
+        return _halfway_vetorizado_buffer_unico(
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            convergencia,
+            inicializacao,
+            checkpoint,
+            instrumentacao,
+        )
+
+    dt = 1.0
+    c2 = 1.0 / 3.0
+    nu = (tau - 0.5) * c2 * dt
+
+    w = W[:, None, None]
+
+    # Layout (9, ny, nx): f[k, j, i]
+    coeficientes = _coeficientes_abertura(depth_value, nx, ny, nu, G, dt)
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = coeficientes
+    rebate = _mascaras_rebate(nx, ny, solido)
+
+    # inicialização; f_old e f_new guardam as populações no formato de
+    # `precisao`, as contas são feitas em float64 sobre f
+    tipo, desvio = PRECISOES[precisao]
+    w_desvio = desvio * w
+    f_old = _populacoes_iniciais(
+        inicializacao, tau, nx, ny, G, depth_value, coeficientes
+    )
+    f_old = (f_old - w_desvio).astype(tipo)
+    f_new = np.empty_like(f_old)
+
+    timestep = 0
+    if checkpoint is not None:
+        timestep = checkpoint.retomar(f_old, convergencia)
+    instrumentacao.iniciar("vetorizado", nx, ny, timestep)
+    # f_old e f_new; f_post e f_post[OPOSTOS] (e f, se convertido) em float64
+    copias = 2 if precisao == "float64" else 3
+    instrumentacao.registrar_populacoes(
+        f_old.nbytes + f_new.nbytes + copias * f_old.size * 8
+    )
+
+    while True:
+        if desvio:
+            f = f_old + w_desvio
+        else:
+            f = f_old.astype(np.float64, copy=False)
+
+        f_post, rho, uh, vh = _colisao_vetorizada(
+            f, tau, denominador, arrasto, forca_x, forca_y, dt
+        )
+        if desvio:
+            f_post -= w_desvio
+        instrumentacao.marcar("colisao")
+
+        # propagação periódica e paredes - halfway
+        for k in range(9):
+            f_new[k] = np.roll(f_post[k], (E[k, 1], E[k, 0]), axis=(0, 1))
+        instrumentacao.marcar("propagacao")
+        np.copyto(f_new, f_post[OPOSTOS], where=rebate)
+        np.copyto(f_new, w - w_desvio, where=solido)
+        instrumentacao.marcar("contorno")
+
+        f_old, f_new = f_new, f_old
+
+        # erro
+        timestep += 1
+        if convergencia.deve_verificar(timestep):
+            u = uh / depth_map
+            v = vh / depth_map
+            if convergencia.verificar(timestep, u, v):
+                break
+        instrumentacao.marcar("convergencia")
+        if checkpoint is not None and checkpoint.deve_salvar(timestep):
+            checkpoint.salvar(timestep, f_old, convergencia)
+            instrumentacao.marcar("checkpoint")
+
+    instrumentacao.finalizar(timestep, convergencia)
+    if checkpoint is not None:
+        checkpoint.finalizar(timestep, f_old, convergencia)
+    return rho.ravel(), u.ravel(), v.ravel()
+
+
+def _colisao_vetorizada(f, tau, denominador, arrasto, forca_x, forca_y, dt):
+    """
+    Momentos e colisão BGK com força de Guo sobre populações (9, ny, nx)
+    ou, em lotes, (9, B, ny, nx), em float64.
+
+    Retorna: (f_post, rho, uh, vh)
+    """
+    forma = (9,) + (1,) * (f.ndim - 1)
+    ex = E[:, 0].reshape(forma)
+    ey = E[:, 1].reshape(forma)
+    w = W.reshape(forma)
+
+    # momentos, somados em k sempre na mesma ordem: o resultado não depende
+    # do formato do bloco (faixas do multiprocesso, lotes), ao contrário de
+    # np.tensordot/sum, cuja ordem de soma muda com o layout
+    rho = f[0].copy()
+    sum_f_ex = np.zeros_like(rho)
+    sum_f_ey = np.zeros_like(rho)
+    for k in range(1, 9):
+        rho += f[k]
+        for soma, e in ((sum_f_ex, E[k, 0]), (sum_f_ey, E[k, 1])):
+            if e > 0:
+                soma += f[k]
+            elif e < 0:
+                soma -= f[k]
+
+    uh = (sum_f_ex + 0.5 * dt * forca_x) / denominador
+    vh = (sum_f_ey + 0.5 * dt * forca_y) / denominador
+
+    # termo de força
+    Fx = forca_x - arrasto * uh
+    Fy = forca_y - arrasto * vh
+
+    # colisão com termo de força (Guo)
+    uu = uh**2 + vh**2
+    eu = ex * uh + ey * vh
+    eF = ex * Fx + ey * Fy
+    uF = uh * Fx + vh * Fy
+    f_eq = w * (rho + 3.0 * eu + 4.5 * eu**2 - 1.5 * uu)
+    Fi = w * (1.0 - 0.5 / tau) * (3.0 * (eF - uF) + 9.0 * eu * eF)
+    f_post = f - (1.0 / tau) * (f - f_eq) + dt * Fi
+
+    return f_post, rho, uh, vh
+
+
+def _desloca(a, dx, dy, out):
+    """Equivale a out[:] = np.roll(a, (dy, dx), axis=(0, 1)), sem alocar."""
+    ny, nx = a.shape
+    for j_orig, j_dest in _fatias_periodicas(dy, ny):
+        for i_orig, i_dest in _fatias_periodicas(dx, nx):
+            out[j_dest, i_dest] = a[j_orig, i_orig]
+
+
+def _fatias_periodicas(d, n):
+    s = d % n
+    if s == 0:
+        return ((slice(None), slice(None)),)
+    return (
+        (slice(0, n - s), slice(s, n)),
+        (slice(n - s, n), slice(0, s)),
+    )
+
+
+def _halfway_vetorizado_buffer_unico(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    convergencia,
+    inicializacao=None,
+    checkpoint=None,
+    instrumentacao=None,
+):
+    """
+    Variante do motor vetorizado com um único array de populações. A
+    colisão é feita direção a direção sobre f com planos de trabalho
+    pré-alocados, e a propagação troca os pares (k, oposto(k)) no lugar
+    usando dois planos auxiliares, o que preserva o halfway bounce-back.
+    """
+    dt = 1.0
+    c2 = 1.0 / 3.0
+    nu = (tau - 0.5) * c2 * dt
+    fator_forca = 1.0 - 0.5 / tau
+
+    coeficientes = _coeficientes_abertura(depth_value, nx, ny, nu, G, dt)
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = coeficientes
+    rebate = _mascaras_rebate(nx, ny, solido)
+    pares = [(1, 2), (3, 4), (5, 6), (7, 8)]
+
+    f = _populacoes_iniciais(
+        inicializacao, tau, nx, ny, G, depth_value, coeficientes
+    )
+    rho, uh, vh, Fx, Fy, uu, uF, eu, eF, tmp, s1, s2 = np.empty((12, ny, nx))
+
+    timestep = 0
+    if checkpoint is not None:
+        timestep = checkpoint.retomar(f, convergencia)
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
+    instrumentacao.iniciar("vetorizado", nx, ny, timestep)
+    instrumentacao.registrar_populacoes(f.nbytes)
+
+    while True:
+        # momentos
+        np.sum(f, axis=0, out=rho)
+        uh.fill(0.0)
+        vh.fill(0.0)
+        for k in range(1, 9):
+            _acumula(uh, f[k], E[k, 0])
+            _acumula(vh, f[k], E[k, 1])
+        np.multiply(forca_x, 0.5 * dt, out=tmp)
+        uh += tmp
+        uh /= denominador
+        np.multiply(forca_y, 0.5 * dt, out=tmp)
+        vh += tmp
+        vh /= denominador
+
+        # termo de força
+        np.multiply(arrasto, uh, out=Fx)
+        np.subtract(forca_x, Fx, out=Fx)
+        np.multiply(arrasto, vh, out=Fy)
+        np.subtract(forca_y, Fy, out=Fy)
+        np.multiply(uh, uh, out=uu)
+        np.multiply(vh, vh, out=tmp)
+        uu += tmp
+        np.multiply(uh, Fx, out=uF)
+        np.multiply(vh, Fy, out=tmp)
+        uF += tmp
+
+        # colisão com termo de força, direção a direção
+        for k in range(9):
+            _combina(E[k, 0], E[k, 1], uh, vh, eu, tmp)
+            _combina(E[k, 0], E[k, 1], Fx, Fy, eF, tmp)
+
+            # s1 = f_eq / tau
+            np.multiply(eu, eu, out=s1)
+            s1 *= 4.5
+            np.multiply(eu, 3.0, out=tmp)
+            s1 += tmp
+            s1 += rho
+            np.multiply(uu, 1.5, out=tmp)
+            s1 -= tmp
+            s1 *= W[k] / tau
+
+            # s2 = dt * Fi
+            np.subtract(eF, uF, out=s2)
+            s2 *= 3.0
+            np.multiply(eu, eF, out=tmp)
+            tmp *= 9.0
+            s2 += tmp
+            s2 *= W[k] * fator_forca * dt
+
+            f[k] *= 1.0 - 1.0 / tau
+            f[k] += s1
+            f[k] += s2
+        instrumentacao.marcar("colisao")
+
+        # propagação no lugar e paredes - halfway
+        for k, o in pares:
+            _desloca(f[k], E[k, 0], E[k, 1], s1)
+            np.copyto(s1, f[o], where=rebate[k])
+            _desloca(f[o], E[o, 0], E[o, 1], s2)
+            np.copyto(s2, f[k], where=rebate[o])
+            f[k] = s1
+            f[o] = s2
+        instrumentacao.marcar("propagacao")
+        np.copyto(f, W[:, None, None], where=solido)
+        instrumentacao.marcar("contorno")
+
+        # erro (sobre uh, vh de antes da colisão, como nos demais motores)
+        timestep += 1
+        if convergencia.deve_verificar(timestep):
+            np.divide(uh, depth_map, out=s1)
+            np.divide(vh, depth_map, out=s2)
+            if convergencia.verificar(timestep, s1, s2):
+                break
+        instrumentacao.marcar("convergencia")
+        if checkpoint is not None and checkpoint.deve_salvar(timestep):
+            checkpoint.salvar(timestep, f, convergencia)
+            instrumentacao.marcar("checkpoint")
+
+    instrumentacao.finalizar(timestep, convergencia)
+    if checkpoint is not None:
+        checkpoint.finalizar(timestep, f, convergencia)
+    return rho.ravel(), (uh / depth_map).ravel(), (vh / depth_map).ravel()
+
+
+def _acumula(out, a, sinal):
+    """out += sinal * a para sinal em {-1, 0, 1}, sem alocar."""
+    if sinal > 0:
+        out += a
+    elif sinal < 0:
+        out -= a
+
+
+def _combina(ex, ey, a, b, out, tmp):
+    """out = ex * a + ey * b, sem alocar."""
+    np.multiply(a, ex, out=out)
+    np.multiply(b, ey, out=tmp)
+    out += tmp
+
+
+def _colide_propaga(
+    f_old,
+    f_new,
+    depth_map,
+    solido,
+    denominador,
+    arrasto,
+    forca_x,
+    forca_y,
+    tau,
+    desvio,
+    rho,
+    u,
+    v,
+):
+    """
+    Uma passada fundida sobre o reticulado: momentos, colisão com força de
+    Guo e propagação (push) com halfway bounce-back nas paredes. As linhas
+    j são distribuídas entre os núcleos; cada destino é escrito por uma
+    única origem, então não há condição de corrida.
+
+    As populações podem estar em float32; com `desvio` = 1 o array guarda
+    f - w. As contas locais são sempre em float64.
+    """
+    ny = f_old.shape[1]
+    nx = f_old.shape[2]
+    fator_forca = 1.0 - 0.5 / tau
+
+    for j in prange(ny):
+        for i in range(nx):
+            if solido[j, i]:
+                rho[j, i] = 1.0
+                u[j, i] = 0.0
+                v[j, i] = 0.0
+                continue
+
+            rho_temp = 0.0
+            sum_f_ex = 0.0
+            sum_f_ey = 0.0
+            for k in range(9):
+                fk = f_old[k, j, i] + desvio * W[k]
+                rho_temp += fk
+                sum_f_ex += fk * E[k, 0]
+                sum_f_ey += fk * E[k, 1]
+
+            uh_local = (sum_f_ex + 0.5 * forca_x[j, i]) / denominador[j, i]
+            vh_local = (sum_f_ey + 0.5 * forca_y[j, i]) / denominador[j, i]
+            u_local = uh_local / depth_map[j, i]
+            v_local = vh_local / depth_map[j, i]
+            rho[j, i] = rho_temp
+            u[j, i] = u_local
+            v[j, i] = v_local
+
+            Fx = forca_x[j, i] - arrasto[j, i] * uh_local
+            Fy = forca_y[j, i] - arrasto[j, i] * vh_local
+            uu = uh_local**2 + vh_local**2
+            uF = uh_local * Fx + vh_local * Fy
+
+            for k in range(9):
+                eu = E[k, 0] * uh_local + E[k, 1] * vh_local
+                eF = E[k, 0] * Fx + E[k, 1] * Fy
+                f_eq = W[k] * (rho_temp + 3.0 * eu + 4.5 * eu**2 - 1.5 * uu)
+                Fi = W[k] * fator_forca * (3.0 * (eF - uF) + 9.0 * eu * eF)
+                fk = f_old[k, j, i] + desvio * W[k]
+                f_post = fk - (fk - f_eq) / tau + Fi - desvio * W[k]
+
+                j_next = j + E[k, 1]
+                i_next = (i + E[k, 0]) % nx
+                if j_next < 0 or j_next > ny - 1 or solido[j_next, i_next]:
+                    # paredes e sólidos - halfway
+                    f_new[OPOSTOS[k], j, i] = f_post
+                else:
+                    f_new[k, j_next, i_next] = f_post
+
+
+def _colide_aa(
+    f,
+    fase,
+    depth_map,
+    solido,
+    denominador,
+    arrasto,
+    forca_x,
+    forca_y,
+    tau,
+    desvio,
+    rho,
+    u,
+    v,
+    local,
+):
+    """
+    Passo do padrão AA sobre um único array de populações.
+
+    Fase 0 (par): colisão local; f*_k(x) é gravada na posição oposta(k)
+    do próprio nó. Fase 1 (ímpar): cada nó lê f_k de oposto(k) em x - e_k,
+    colide e grava f*_k em k no nó x + e_k, devolvendo o layout natural.
+    Nas paredes e sólidos, a leitura/escrita recai no próprio nó, que é
+    exatamente o halfway bounce-back. Cada posição de memória é lida e
+    escrita por um único nó, então o passo é seguro em paralelo.
+
+    `desvio` tem o mesmo significado que em `_colide_propaga`. `local`
+    (ny, 9) é a área de trabalho com as populações lidas de cada nó, uma
+    linha por j, alocada uma única vez pelo chamador.
+    """
+    ny = f.shape[1]
+    nx = f.shape[2]
+    fator_forca = 1.0 - 0.5 / tau
+
+    for j in prange(ny):
+        fl = local[j]
+        for i in range(nx):
+            if solido[j, i]:
+                rho[j, i] = 1.0
+                u[j, i] = 0.0
+                v[j, i] = 0.0
+                continue
+
+            for k in range(9):
+                j_orig = j - E[k, 1]
+                i_orig = (i - E[k, 0]) % nx
+                if (
+                    fase == 0
+                    or j_orig < 0
+                    or j_orig > ny - 1
+                    or solido[j_orig, i_orig]
+                ):
+                    fl[k] = f[k, j, i] + desvio * W[k]
+                else:
+                    fl[k] = f[OPOSTOS[k], j_orig, i_orig] + desvio * W[k]
+
+            rho_temp = 0.0
+            sum_f_ex = 0.0
+            sum_f_ey = 0.0
+            for k in range(9):
+                rho_temp += fl[k]
+                sum_f_ex += fl[k] * E[k, 0]
+                sum_f_ey += fl[k] * E[k, 1]
+
+            uh_local = (sum_f_ex + 0.5 * forca_x[j, i]) / denominador[j, i]
+            vh_local = (sum_f_ey + 0.5 * forca_y[j, i]) / denominador[j, i]
+            u_local = uh_local / depth_map[j, i]
+            v_local = vh_local / depth_map[j, i]
+            rho[j, i] = rho_temp
+            u[j, i] = u_local
+            v[j, i] = v_local
+
+            Fx = forca_x[j, i] - arrasto[j, i] * uh_local
+            Fy = forca_y[j, i] - arrasto[j, i] * vh_local
+            uu = uh_local**2 + vh_local**2
+            uF = uh_local * Fx + vh_local * Fy
+
+            for k in range(9):
+                eu = E[k, 0] * uh_local + E[k, 1] * vh_local
+                eF = E[k, 0] * Fx + E[k, 1] * Fy
+                f_eq = W[k] * (rho_temp + 3.0 * eu + 4.5 * eu**2 - 1.5 * uu)
+                Fi = W[k] * fator_forca * (3.0 * (eF - uF) + 9.0 * eu * eF)
+                f_post = fl[k] - (fl[k] - f_eq) / tau + Fi - desvio * W[k]
+
+                j_next = j + E[k, 1]
+                i_next = (i + E[k, 0]) % nx
+                if (
+                    fase == 0
+                    or j_next < 0
+                    or j_next > ny - 1
+                    or solido[j_next, i_next]
+                ):
+                    f[OPOSTOS[k], j, i] = f_post
+                else:
+                    f[k, j_next, i_next] = f_post
+
+
+if numba is not None:
+    _colide_propaga = numba.njit(parallel=True, cache=True)(_colide_propaga)
+    _colide_aa = numba.njit(parallel=True, cache=True)(_colide_aa)
+
+
+def _halfway_numba(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    buffer_unico=False,
+    convergencia=None,
+    inicializacao=None,
+    precisao="float64",
+    checkpoint=None,
+    instrumentacao=None,
+):
+    if convergencia is None:
+        convergencia = Convergencia()
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
+    if numba is None:
+        print("numba não instalado: usando o motor vetorizado.")
+        if precisao != "float64":
+            # dois arrays float32 ocupam o mesmo que um único em float64
+            buffer_unico = False
+        return _halfway_vetorizado(
+            tau,
+            nx,
+            ny,
+            G,
+            depth_value,
+            buffer_unico=buffer_unico,
+            convergencia=convergencia,
+            inicializacao=inicializacao,
+            precisao=precisao,
+            checkpoint=checkpoint,
+            instrumentacao=instrumentacao,
+        )
+
+    dt = 1.0
+    c2 = 1.0 / 3.0
+    nu = (tau - 0.5) * c2 * dt
+
+    coeficientes = _coeficientes_abertura(depth_value, nx, ny, nu, G, dt)
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = coeficientes
+
+    tipo, desvio = PRECISOES[precisao]
+    f_old = _populacoes_iniciais(
+        inicializacao, tau, nx, ny, G, depth_value, coeficientes
+    )
+    f_old = (f_old - desvio * W[:, None, None]).astype(tipo)
+    f_new = None if buffer_unico else np.empty_like(f_old)
+    local = np.empty((ny, 9)) if buffer_unico else None
+    rho = np.empty((ny, nx))
+    u = np.empty((ny, nx))
+    v = np.empty((ny, nx))
+
+    # no padrão AA, a paridade de timestep define a disposição de f_old
+    timestep = 0
+    if checkpoint is not None:
+        timestep = checkpoint.retomar(f_old, convergencia)
+    instrumentacao.iniciar("numba", nx, ny, timestep)
+    instrumentacao.registrar_populacoes(
+        f_old.nbytes + (0 if f_new is None else f_new.nbytes)
+    )
+
+    while True:
+        if buffer_unico:
+            _colide_aa(
+                f_old,
+                timestep % 2,
+                depth_map,
+                solido,
+                denominador,
+                arrasto,
+                forca_x,
+                forca_y,
+                float(tau),
+                desvio,
+                rho,
+                u,
+                v,
+                local,
+            )
+        else:
+            _colide_propaga(
+                f_old,
+                f_new,
+                depth_map,
+                solido,
+                denominador,
+                arrasto,
+                forca_x,
+                forca_y,
+                float(tau),
+                desvio,
+                rho,
+                u,
+                v,
+            )
+            f_old, f_new = f_new, f_old
+        instrumentacao.marcar("colisao_propagacao")
 
         # erro
         timestep += 1
-        atual = np.sum((u**2 + v**2) ** 0.5)
-        erro = np.abs(atual - anterior) / atual
-        anterior = atual
-        print(f"timestep {timestep}: erro = {erro:.1e}", end="\r")
+        if convergencia.deve_verificar(timestep) and convergencia.verificar(
+            timestep, u, v
+        ):
+            break
+        instrumentacao.marcar("convergencia")
+        if checkpoint is not None and checkpoint.deve_salvar(timestep):
+            checkpoint.salvar(timestep, f_old, convergencia)
+            instrumentacao.marcar("checkpoint")
+
+    instrumentacao.finalizar(timestep, convergencia)
+    if checkpoint is not None:
+        checkpoint.finalizar(timestep, f_old, convergencia)
+    return rho.ravel(), u.ravel(), v.ravel()
+
+
+def numero_processos():
+    """Núcleos disponíveis para este processo (respeita o SLURM/affinity)."""
+    if "SLURM_CPUS_PER_TASK" in os.environ:
+        return int(os.environ["SLURM_CPUS_PER_TASK"])
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _halfway_multiprocesso(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    buffer_unico=False,
+    convergencia=None,
+    inicializacao=None,
+    precisao="float64",
+    checkpoint=None,
+    instrumentacao=None,
+):
+    if buffer_unico or precisao != "float64":
+        raise ValueError(
+            "O motor multiprocesso não suporta buffer_unico nem precisão "
+            "reduzida"
+        )
+    # importação tardia: lbm_multiprocesso depende deste módulo
+    import lbm_multiprocesso
+
+    return lbm_multiprocesso.halfway_multiprocesso(
+        tau,
+        nx,
+        ny,
+        G,
+        depth_value,
+        convergencia=convergencia,
+        inicializacao=inicializacao,
+        checkpoint=checkpoint,
+        instrumentacao=instrumentacao,
+    )
+
+
+MOTORES = {
+    "laco": _halfway_laco,
+    "vetorizado": _halfway_vetorizado,
+    "numba": _halfway_numba,
+    "multiprocesso": _halfway_multiprocesso,
+}
+
+
+def halfway_lote(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    convergencia=None,
+    inicializacao=None,
+    instrumentacao=None,
+):
+    """
+    Resolve um lote de B reticulados (nx, ny) independentes de uma só vez,
+    empilhados em um eixo de lote das populações (9, B, ny, nx), com as
+    mesmas contas do motor vetorizado. Serve para varreduras de muitos
+    casos pequenos, em que o custo por passo de cada `halfway` é dominado
+    pelo Python.
+
+    `tau` tem shape (B,); `G` é (2,) ou (B, 2); `depth_value` é um
+    escalar, (B,) (abertura uniforme por membro) ou (B, ny, nx) ou
+    (B, ny * nx) (mapas). `inicializacao` é None ou "analitico", para
+    todos os membros.
+
+    `convergencia` é o modelo da política de parada: cada membro usa uma
+    cópia e sai do lote assim que para, e o callback do modelo recebe o
+    maior erro entre os membros verificados. Ao final, `membros` guarda a
+    cópia de cada membro (com `historico` e `motivo`), e `motivo` é
+    "convergiu" se todos convergiram ou o motivo do primeiro que não
+    convergiu.
+
+    Retorna: (rho, u, v) com shape (B, nx * ny); a linha b é o resultado
+    de `halfway` com os parâmetros do membro b.
+    """
+    if convergencia is None:
+        convergencia = Convergencia()
+    convergencia.reiniciar()
+    if instrumentacao is None:
+        instrumentacao = Instrumentacao()
+
+    dt = 1.0
+    tau = np.asarray(tau, dtype=float).ravel()
+    B = tau.size
+    G = np.broadcast_to(np.asarray(G, dtype=float), (B, 2))
+    depth_value = np.asarray(depth_value, dtype=float)
+    if depth_value.ndim == 0:
+        depth_value = np.full((B, ny * nx), float(depth_value))
+    elif depth_value.ndim == 1:
+        depth_value = np.repeat(depth_value[:, None], ny * nx, axis=1)
+    depth_value = depth_value.reshape(B, ny, nx)
+
+    # coeficientes, populações e máscaras de cada membro, no eixo 1
+    coeficientes = []
+    f = np.empty((9, B, ny, nx))
+    rebate = np.empty((9, B, ny, nx), dtype=bool)
+    for b in range(B):
+        nu = (tau[b] - 0.5) / 3.0 * dt
+        c = _coeficientes_abertura(depth_value[b], nx, ny, nu, G[b], dt)
+        coeficientes.append(c)
+        f[:, b] = _populacoes_iniciais(
+            inicializacao, tau[b], nx, ny, G[b], depth_value[b], c
+        )
+        rebate[:, b] = _mascaras_rebate(nx, ny, c[1])
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = (
+        np.stack(c) for c in zip(*coeficientes)
+    )
+    w = W[:, None, None, None]
+
+    membros = []
+    for _ in range(B):
+        membro = copy.copy(convergencia)
+        membro.callback = None
+        membro.reiniciar()
+        membros.append(membro)
+    convergencia.membros = membros
+
+    rho_final, u_final, v_final = np.empty((3, B, ny, nx))
+    ativos = np.arange(B)
+    tau_ativos = tau.reshape(1, B, 1, 1)
+
+    timestep = 0
+    atualizacoes = 0
+    instrumentacao.iniciar(f"lote x{B}", nx, ny)
+    # f e, em float64, f_post e f_post[OPOSTOS]
+    instrumentacao.registrar_populacoes(3 * f.nbytes)
+
+    while True:
+        f_post, rho, uh, vh = _colisao_vetorizada(
+            f, tau_ativos, denominador, arrasto, forca_x, forca_y, dt
+        )
+        instrumentacao.marcar("colisao")
+
+        # propagação periódica e paredes - halfway
+        for k in range(9):
+            f[k] = np.roll(f_post[k], (E[k, 1], E[k, 0]), axis=(1, 2))
+        instrumentacao.marcar("propagacao")
+        np.copyto(f, f_post[OPOSTOS], where=rebate)
+        np.copyto(f, w, where=solido)
+        instrumentacao.marcar("contorno")
+
+        # erro, membro a membro
+        timestep += 1
+        atualizacoes += ativos.size * nx * ny
+        if convergencia.deve_verificar(timestep):
+            u = uh / depth_map
+            v = vh / depth_map
+            parar = np.array(
+                [
+                    membros[b].verificar(timestep, u[n], v[n])
+                    for n, b in enumerate(ativos)
+                ]
+            )
+            if convergencia.callback is not None:
+                convergencia.callback(
+                    timestep, max(membros[b].historico[-1][1] for b in ativos)
+                )
+
+            if parar.any():
+                rho_final[ativos[parar]] = rho[parar]
+                u_final[ativos[parar]] = u[parar]
+                v_final[ativos[parar]] = v[parar]
+                manter = ~parar
+                if not manter.any():
+                    break
+                # os membros que pararam saem do lote
+                ativos = ativos[manter]
+                f = f[:, manter]
+                rebate = rebate[:, manter]
+                tau_ativos = tau_ativos[:, manter]
+                depth_map, solido, denominador, arrasto, forca_x, forca_y = (
+                    c[manter]
+                    for c in (
+                        depth_map,
+                        solido,
+                        denominador,
+                        arrasto,
+                        forca_x,
+                        forca_y,
+                    )
+                )
+        instrumentacao.marcar("convergencia")
+
+    motivos = [m.motivo for m in membros if m.motivo != "convergiu"]
+    convergencia.motivo = motivos[0] if motivos else "convergiu"
+    instrumentacao.finalizar(timestep, convergencia, atualizacoes)
+    return (
+        rho_final.reshape(B, -1),
+        u_final.reshape(B, -1),
+        v_final.reshape(B, -1),
+    )
+
+
+def halfway_multinivel(
+    tau, nx, ny, G, depth_value, niveis=2, fator=2, **opcoes
+):
+    """
+    Acelera a convergência de reticulados finos resolvendo antes o mesmo
+    problema físico em `niveis - 1` reticulados mais grossos, cada um
+    `fator` vezes mais grosso que o seguinte. O campo de velocidade
+    convergido de um nível é prolongado para o nível seguinte, onde
+    inicializa as populações, até o reticulado pedido.
+
+    Com tau fixo (escala difusiva, dt proporcional a dx²), um nível
+    r = dx_grosso / dx vezes mais grosso tem a mesma viscosidade em
+    unidades de rede, abertura h / r, força G r³ e velocidades r vezes
+    maiores. Mapas de abertura são restringidos pela média de cada bloco
+    de nós.
+
+    ny deve ser divisível por fator**(niveis - 1); nx também, a menos que
+    a abertura seja invariante em x (nesse caso nx é mantido). `opcoes`
+    são repassadas a `halfway` em todos os níveis, exceto `checkpoint`,
+    usado só no nível final; `inicializacao` não é aceita, pois o nível
+    grosso é a inicialização. Cada nível grosso usa uma cópia de
+    `convergencia`; ao final, `convergencia.niveis` guarda as políticas
+    de todos os níveis, do mais grosso ao final.
+
+    Retorna: (rho, u, v) do nível final, como `halfway`.
+    """
+    if niveis < 1 or fator < 2:
+        raise ValueError("O modo multinível exige niveis >= 1 e fator >= 2.")
+    if np.ndim(tau) > 0 or opcoes.get("inicializacao") is not None:
+        raise ValueError(
+            "O modo multinível não aceita lotes nem inicializacao."
+        )
+    opcoes.pop("inicializacao", None)
+    convergencia = opcoes.pop("convergencia", None)
+    if convergencia is None:
+        convergencia = Convergencia()
+    checkpoint = opcoes.pop("checkpoint", None)
+
+    # reticulados (nx, ny, abertura) do final ao mais grosso
+    invariante = _coluna_invariante(depth_value, nx, ny, None) is not None
+    fator_x = 1 if invariante else fator
+    reticulados = [(nx, ny, np.asarray(depth_value, dtype=float))]
+    for _ in range(niveis - 1):
+        nx_fino, ny_fino, abertura = reticulados[-1]
+        if ny_fino % fator != 0 or nx_fino % fator_x != 0:
+            raise ValueError(
+                f"O reticulado ({nx}, {ny}) não comporta {niveis} níveis de "
+                f"fator {fator}: ny (e nx, se a abertura varia em x) deve "
+                f"ser divisível por {fator ** (niveis - 1)}"
+            )
+        nx_grosso, ny_grosso = nx_fino // fator_x, ny_fino // fator
+        if abertura.ndim > 0:
+            abertura = abertura.reshape(
+                ny_grosso, fator, nx_grosso, fator_x
+            ).mean(axis=(1, 3))
+        reticulados.append((nx_grosso, ny_grosso, abertura / fator))
+
+    politicas = []
+    campos = None
+    for nivel in range(niveis - 1, -1, -1):
+        nx_nivel, ny_nivel, abertura = reticulados[nivel]
+        if campos is not None:
+            # velocidades do nível grosso nas unidades de rede deste nível
+            campos = tuple(
+                _prolongar(c, nx_nivel, ny_nivel, abertura) / fator
+                for c in campos
+            )
+        politica = convergencia if nivel == 0 else copy.copy(convergencia)
+        politicas.append(politica)
+        resultado = halfway(
+            tau,
+            nx_nivel,
+            ny_nivel,
+            [g * fator ** (3 * nivel) for g in G],
+            abertura,
+            convergencia=politica,
+            inicializacao=campos,
+            checkpoint=checkpoint if nivel == 0 else None,
+            **opcoes,
+        )
+        campos = tuple(c.reshape(ny_nivel, nx_nivel) for c in resultado[1:])
+    convergencia.niveis = politicas
+    return resultado
+
+
+def _prolongar(campo, nx, ny, abertura):
+    """
+    Interpola bilinearmente um campo (ny_grosso, nx_grosso), definido nos
+    centros das células, para (ny, nx). Em y, as paredes a meia célula
+    têm velocidade nula (reflexão ímpar); em x, o campo é periódico. Nós
+    sólidos de `abertura` recebem zero.
+    """
+    for eixo, n in ((0, ny), (1, nx)):
+        n_grosso = campo.shape[eixo]
+        if n_grosso == n:
+            continue
+        posicao = (np.arange(n) + 0.5) * n_grosso / n - 0.5
+        if eixo == 0:
+            campo = np.concatenate([-campo[:1], campo, -campo[-1:]])
+            posicao += 1.0
+        i0 = np.floor(posicao).astype(int)
+        peso = posicao - i0
+        a = np.take(campo, i0 % campo.shape[eixo], axis=eixo)
+        b = np.take(campo, (i0 + 1) % campo.shape[eixo], axis=eixo)
+        peso = peso[:, None] if eixo == 0 else peso[None, :]
+        campo = a + peso * (b - a)
+    if np.ndim(abertura) > 0:
+        campo = np.where(np.reshape(abertura, (ny, nx)) == 0, 0.0, campo)
+    return campo
+
+
+def halfway_em_cache(tau, nx, ny, G, depth_value, cache=True, **opcoes):
+    """
+    Igual a `halfway`, mas consulta antes o cache de resultados em disco.
+
+    A chave combina VERSAO_SOLVER, os parâmetros físicos, a política de
+    convergência, a `inicializacao` (campos (u, v) pelo hash do conteúdo)
+    e os `niveis`; o motor e o modo de armazenamento não entram, pois não
+    alteram a solução convergida. Por isso só são guardadas as execuções
+    que convergiram: as que param por max_passos, tempo_max ou divergência
+    dependem dessas opções e são sempre refeitas. Em um acerto,
+    `convergencia.motivo` e `historico` são restaurados da entrada.
+    `cache` pode ser True (cache padrão), False ou uma instância de
+    `cache_lbm.CacheResultados`.
+    """
+    if cache is False:
+        return halfway(tau, nx, ny, G, depth_value, **opcoes)
+    if cache is True:
+        cache = cache_lbm.cache_padrao()
+
+    convergencia = opcoes.get("convergencia")
+    if convergencia is None:
+        convergencia = Convergencia()
+        opcoes["convergencia"] = convergencia
 
+    parametros = {
+        "versao": VERSAO_SOLVER,
+        "tau": float(tau),
+        "nx": int(nx),
+        "ny": int(ny),
+        "G": [float(g) for g in G],
+        "abertura": np.asarray(depth_value, dtype=float),
+        "criterio": convergencia.criterio,
+        "tolerancia": convergencia.tolerancia,
+        "intervalo": convergencia.intervalo,
+        "max_passos": convergencia.max_passos,
+    }
+    precisao = opcoes.get("precisao", "float64")
+    if precisao != "float64":
+        parametros["precisao"] = precisao
+    niveis = opcoes.get("niveis", 1)
+    if niveis > 1:
+        # `halfway` usa o fator padrão de `halfway_multinivel`
+        parametros["niveis"] = int(niveis)
+        parametros["fator"] = 2
+    inicializacao = opcoes.get("inicializacao")
+    if isinstance(inicializacao, str):
+        parametros["inicializacao"] = inicializacao
+    elif inicializacao is not None:
+        parametros["inicializacao"] = [
+            np.asarray(campo, dtype=float) for campo in inicializacao
+        ]
+    chave = cache.chave(parametros)
+
+    resultado = cache.obter(chave)
+    # entradas sem motivo podem ter vindo de execuções interrompidas
+    if resultado is not None and "motivo" in resultado:
+        convergencia.reiniciar()
+        convergencia.restaurar(resultado["historico"], np.empty(0))
+        convergencia.motivo = str(resultado["motivo"])
+        return resultado["rho"], resultado["u"], resultado["v"]
+
+    rho, u, v = halfway(tau, nx, ny, G, depth_value, **opcoes)
+    if convergencia.motivo == "convergiu":
+        cache.guardar(
+            chave,
+            parametros,
+            rho=rho,
+            u=u,
+            v=v,
+            motivo=np.array(convergencia.motivo),
+            historico=convergencia.estado()["historico"],
+        )
     return rho, u, v
 
 
-def perfil_velocidade_lbm_autoral(tau, Ny, g_lat, h, dx):
+def perfil_velocidade_lbm_autoral(
+    tau, Ny, g_lat, h, dx, motor="vetorizado", cache=True, **opcoes
+):
+    u_simu, _, _ = perfil_e_permeabilidade_lbm_autoral(
+        tau, Ny, g_lat, h, dx, motor=motor, cache=cache, **opcoes
+    )
+    return u_simu
+
+
+def permeabilidade_lbm_autoral(
+    tau, Ny, g_lat, h, dx, motor="vetorizado", cache=True, **opcoes
+):
+    _, absperm, absperm_mD = perfil_e_permeabilidade_lbm_autoral(
+        tau, Ny, g_lat, h, dx, motor=motor, cache=cache, **opcoes
+    )
+    return absperm, absperm_mD
+
+
+def perfil_e_permeabilidade_lbm_autoral(
+    tau, Ny, g_lat, h, dx, motor="vetorizado", cache=True, **opcoes
+):
+    """
+    Perfil de velocidade e permeabilidade a partir de uma única execução.
+    `motor` é o de `halfway`; o padrão é o vetorizado, como em varredura
+    ("laco" fica como implementação de referência).
+
+    Retorna: (u_simu, permeabilidade_um2, permeabilidade_mD)
+    """
     Nx = 3
-    rho_hw, u_hw, v_hw = halfway(tau, Nx, Ny, g_lat, h)
+    rho_hw, u_hw, v_hw = halfway_em_cache(
+        tau, Nx, Ny, g_lat, h, cache=cache, motor=motor, **opcoes
+    )
     u_simu = np.zeros(Ny)
 
     for j in range(Ny):
         idx_node = (Nx // 2) + Nx * j
         u_simu[j] = u_hw[idx_node] * dx
 
-    return u_simu
-
-
-def permeabilidade_lbm_autoral(tau, Ny, g_lat, h, dx):
-    Nx = 3
-    rho_hw, u_hw, v_hw = halfway(tau, Nx, Ny, g_lat, h)
     nu_lat = (tau - 0.5) / 3.0
     absperm = dx**2 * nu_lat / g_lat[0] * np.sum(u_hw) / ((Ny) * Nx)
-    return absperm, absperm / 0.0009869233
+    return u_simu, absperm, absperm / 0.0009869233
 
 
 if __name__ == "__main__":
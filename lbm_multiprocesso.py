@@ -0,0 +1,420 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import connection, shared_memory
+from threading import BrokenBarrierError
+
+import numpy as np
+
+import lbm_autoral
+from lbm_autoral import E, OPOSTOS, W
+
+
+def halfway_multiprocesso(
+    tau,
+    nx,
+    ny,
+    G,
+    depth_value,
+    processos=None,
+    convergencia=None,
+    inicializacao=None,
+    checkpoint=None,
+    instrumentacao=None,
+):
+    """
+    Motor vetorizado com decomposição do reticulado em faixas ao longo de x,
+    uma por processo.
+
+    As populações (dois buffers), rho, u e v ficam em
+    `multiprocessing.shared_memory`. A cada passo, cada processo lê de f_old
+    a sua faixa mais uma coluna de halo de cada lado (periódica em x), faz a
+    colisão e a propagação localmente e grava apenas a sua faixa em f_new.
+    Uma barreira separa os passos; nos passos de verificação, o processo
+    principal avalia a convergência e uma segunda barreira distribui a
+    decisão. A colisão é a mesma do motor vetorizado serial, então o
+    resultado é idêntico a ele. Com `checkpoint` (ver
+    `lbm_autoral.Checkpoint`), os processos também se sincronizam nos
+    passos de gravação, feita pelo processo principal. A `instrumentacao`
+    mede, no processo principal, a espera pelas faixas e a verificação.
+
+    Os processos são criados por um forkserver: scripts que usam este motor
+    devem proteger o código principal com `if __name__ == "__main__":`.
+
+    Retorna: (rho, u, v) em arrays 1D indexados por i + nx * j.
+    """
+    if convergencia is None:
+        convergencia = lbm_autoral.Convergencia()
+    if instrumentacao is None:
+        instrumentacao = lbm_autoral.Instrumentacao()
+    if processos is None:
+        processos = lbm_autoral.numero_processos()
+    processos = max(1, min(processos, nx))
+
+    dt = 1.0
+    nu = (tau - 0.5) / 3.0 * dt
+    coeficientes = lbm_autoral._coeficientes_abertura(
+        depth_value, nx, ny, nu, G, dt
+    )
+    solido = coeficientes[1]
+    rebate = lbm_autoral._mascaras_rebate(nx, ny, solido)
+    f_inicial = lbm_autoral._populacoes_iniciais(
+        inicializacao, tau, nx, ny, G, depth_value, coeficientes
+    )
+
+    memorias = {
+        "f": shared_memory.SharedMemory(create=True, size=2 * f_inicial.nbytes),
+        "campos": shared_memory.SharedMemory(create=True, size=3 * ny * nx * 8),
+        "parar": shared_memory.SharedMemory(create=True, size=1),
+    }
+    try:
+        return _coordenar(
+            memorias,
+            processos,
+            nx,
+            ny,
+            tau,
+            dt,
+            coeficientes,
+            rebate,
+            f_inicial,
+            convergencia,
+            checkpoint,
+            instrumentacao,
+        )
+    finally:
+        _liberar(memorias, remover=True)
+
+
+def _coordenar(
+    memorias,
+    processos,
+    nx,
+    ny,
+    tau,
+    dt,
+    coeficientes,
+    rebate,
+    f_inicial,
+    convergencia,
+    checkpoint,
+    instrumentacao,
+):
+    """Inicia os processos das faixas e conduz o critério de parada."""
+    f, campos, parar = _vistas(memorias, nx, ny)
+    f[0] = f_inicial
+    parar[0] = False
+    timestep = 0
+    if checkpoint is not None:
+        timestep = checkpoint.retomar(f[0], convergencia)
+
+    # forkserver: os processos não herdam os threads do numba nem o estado
+    # do processo principal (fork após o numba paralelo trava na saída)
+    contexto = mp.get_context("forkserver")
+    barreira = contexto.Barrier(processos + 1)
+    faixas = np.array_split(np.arange(nx), processos)
+    trabalhadores = [
+        contexto.Process(
+            target=_trabalhador,
+            args=(
+                {nome: m.name for nome, m in memorias.items()},
+                nx,
+                ny,
+                int(faixa[0]),
+                int(faixa[-1]) + 1,
+                tau,
+                dt,
+                coeficientes,
+                rebate,
+                (convergencia.intervalo, convergencia.max_passos),
+                checkpoint,
+                timestep,
+                barreira,
+            ),
+            daemon=True,
+        )
+        for faixa in faixas
+    ]
+    for p in trabalhadores:
+        p.start()
+    threading.Thread(
+        target=_vigiar, args=(trabalhadores, barreira), daemon=True
+    ).start()
+
+    par = 0
+    instrumentacao.iniciar(f"multiprocesso x{processos}", nx, ny, timestep)
+    # os dois buffers compartilhados e, somadas as faixas com halo, a cópia
+    # de f_old, f_post e f_post[OPOSTOS] em cada processo
+    instrumentacao.registrar_populacoes(
+        f.nbytes + 3 * 9 * ny * (nx + 2 * processos) * 8
+    )
+    try:
+        while True:
+            timestep += 1
+            par = 1 - par
+            barreira.wait()
+            instrumentacao.marcar("passo")
+            if _sincronizar(convergencia, checkpoint, timestep):
+                if convergencia.deve_verificar(timestep):
+                    parar[0] = convergencia.verificar(
+                        timestep, campos[1], campos[2]
+                    )
+                instrumentacao.marcar("convergencia")
+                if (
+                    not parar[0]
+                    and checkpoint is not None
+                    and checkpoint.deve_salvar(timestep)
+                ):
+                    checkpoint.salvar(timestep, f[par], convergencia)
+                    instrumentacao.marcar("checkpoint")
+                barreira.wait()
+                if parar[0]:
+                    break
+    except BrokenBarrierError:
+        raise RuntimeError(
+            "Um processo da decomposição falhou; veja o erro acima."
+        ) from None
+    finally:
+        for p in trabalhadores:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+    instrumentacao.finalizar(timestep, convergencia)
+    if checkpoint is not None:
+        checkpoint.finalizar(timestep, f[par], convergencia)
+    return tuple(c.ravel().copy() for c in campos)
+
+
+def _vigiar(trabalhadores, barreira):
+    """Quebra a barreira se um processo terminar com erro ou for morto."""
+    pendentes = {p.sentinel: p for p in trabalhadores}
+    while pendentes:
+        for sentinela in connection.wait(list(pendentes)):
+            if pendentes.pop(sentinela).exitcode != 0:
+                barreira.abort()
+                return
+
+
+def _sincronizar(convergencia, checkpoint, timestep):
+    """Passos em que os processos esperam pelo processo principal."""
+    return convergencia.deve_verificar(timestep) or (
+        checkpoint is not None and checkpoint.deve_salvar(timestep)
+    )
+
+
+def _liberar(memorias, remover=False):
+    for m in memorias.values():
+        try:
+            m.close()
+        except BufferError:
+            # ainda há vistas vivas (por exemplo, no traceback de um erro)
+            pass
+        if remover:
+            m.unlink()
+
+
+def _vistas(memorias, nx, ny):
+    """Arrays NumPy sobre os blocos de memória compartilhada."""
+    f = np.ndarray((2, 9, ny, nx), dtype=np.float64, buffer=memorias["f"].buf)
+    campos = np.ndarray(
+        (3, ny, nx), dtype=np.float64, buffer=memorias["campos"].buf
+    )
+    parar = np.ndarray((1,), dtype=np.bool_, buffer=memorias["parar"].buf)
+    return f, campos, parar
+
+
+def _trabalhador(
+    nomes,
+    nx,
+    ny,
+    i0,
+    i1,
+    tau,
+    dt,
+    coeficientes,
+    rebate,
+    verificacao,
+    checkpoint,
+    timestep,
+    barreira,
+):
+    """Processo de uma faixa: conecta-se à memória compartilhada e a avança."""
+    memorias = {
+        nome: shared_memory.SharedMemory(name=nome_shm)
+        for nome, nome_shm in nomes.items()
+    }
+    try:
+        _avancar_faixa(
+            memorias,
+            nx,
+            ny,
+            i0,
+            i1,
+            tau,
+            dt,
+            coeficientes,
+            rebate,
+            verificacao,
+            checkpoint,
+            timestep,
+            barreira,
+        )
+    except BrokenBarrierError:
+        pass
+    except BaseException:
+        barreira.abort()
+        raise
+    finally:
+        _liberar(memorias)
+
+
+def _avancar_faixa(
+    memorias,
+    nx,
+    ny,
+    i0,
+    i1,
+    tau,
+    dt,
+    coeficientes,
+    rebate,
+    verificacao,
+    checkpoint,
+    timestep,
+    barreira,
+):
+    """Avança as colunas [i0, i1) até o processo principal mandar parar."""
+    f, campos, parar = _vistas(memorias, nx, ny)
+    intervalo, max_passos = verificacao
+    convergencia = lbm_autoral.Convergencia(
+        intervalo=intervalo, max_passos=max_passos, callback=None
+    )
+
+    # colunas da faixa com uma coluna de halo de cada lado
+    colunas = np.r_[(i0 - 1) % nx, np.arange(i0, i1), i1 % nx]
+    depth_map, solido, denominador, arrasto, forca_x, forca_y = (
+        c[:, colunas] for c in coeficientes
+    )
+    faixa = slice(1, i1 - i0 + 1)
+    rebate = rebate[:, :, i0:i1]
+    solido = solido[:, faixa]
+    depth_faixa = depth_map[:, faixa]
+    w = W[:, None, None]
+
+    par = 0
+    while True:
+        f_post, rho, uh, vh = lbm_autoral._colisao_vetorizada(
+            f[par][:, :, colunas],
+            tau,
+            denominador,
+            arrasto,
+            forca_x,
+            forca_y,
+            dt,
+        )
+
+        # propagação periódica e paredes - halfway
+        f_new = f[1 - par][:, :, i0:i1]
+        for k in range(9):
+            deslocado = np.roll(f_post[k], (E[k, 1], E[k, 0]), axis=(0, 1))
+            f_new[k] = deslocado[:, faixa]
+        np.copyto(f_new, f_post[OPOSTOS][:, :, faixa], where=rebate)
+        np.copyto(f_new, w, where=solido)
+
+        campos[0][:, i0:i1] = rho[:, faixa]
+        campos[1][:, i0:i1] = uh[:, faixa] / depth_faixa
+        campos[2][:, i0:i1] = vh[:, faixa] / depth_faixa
+
+        par = 1 - par
+        timestep += 1
+        barreira.wait()
+        if _sincronizar(convergencia, checkpoint, timestep):
+            barreira.wait()
+            if parar[0]:
+                return
+
+
+def verificar_identidade(nx=130, ny=70, passos=200, processos=(1, 2, 3)):
+    """
+    Confere que o motor multiprocesso reproduz bit a bit o vetorizado
+    serial (abertura heterogênea, força em x e y) para cada número de
+    processos. Levanta AssertionError se algum campo diferir.
+    """
+    abertura = 8.0 + np.random.default_rng(0).random((ny, nx))
+    g_lat = [1.0e-5, 2.0e-6]
+
+    def convergencia():
+        return lbm_autoral.Convergencia(
+            max_passos=passos, intervalo=passos, callback=None
+        )
+
+    referencia = lbm_autoral.halfway(
+        1.1,
+        nx,
+        ny,
+        g_lat,
+        abertura,
+        motor="vetorizado",
+        convergencia=convergencia(),
+    )
+    for n in processos:
+        resultado = halfway_multiprocesso(
+            1.1,
+            nx,
+            ny,
+            g_lat,
+            abertura,
+            processos=n,
+            convergencia=convergencia(),
+        )
+        for nome, a, b in zip(("rho", "u", "v"), referencia, resultado):
+            assert np.array_equal(a, b), (
+                f"{nome} com {n} processos difere do vetorizado em até "
+                f"{np.abs(a - b).max():.3e}"
+            )
+    print(f"Multiprocesso idêntico ao vetorizado para {processos} processos.")
+
+
+if __name__ == "__main__":
+    verificar_identidade()
+
+    # Escalonamento de 1 a N processos em um reticulado grande, com número
+    # fixo de passos
+    nx, ny = 1024, 512
+    passos = 200
+    g_lat = [1.0e-8, 0.0]
+    maximo = lbm_autoral.numero_processos()
+
+    print(f"Reticulado {nx}x{ny}, {passos} passos, até {maximo} processos")
+    print("-" * 60)
+    print(
+        f"{'Processos':<10} | {'Tempo (s)':<12} | {'MLUPS':<10} | "
+        f"{'Speedup':<10}"
+    )
+    print("-" * 60)
+    referencia = None
+    for processos in sorted({1, 2, 4, 8, 16, 32, maximo}):
+        if processos > maximo:
+            continue
+        convergencia = lbm_autoral.Convergencia(
+            max_passos=passos, intervalo=passos, callback=None
+        )
+        inicio = time.perf_counter()
+        halfway_multiprocesso(
+            1.1,
+            nx,
+            ny,
+            g_lat,
+            8.0,
+            processos=processos,
+            convergencia=convergencia,
+        )
+        duracao = time.perf_counter() - inicio
+        referencia = referencia or duracao
+        mlups = nx * ny * passos / duracao / 1e6
+        print(
+            f"{processos:<10d} | {duracao:<12.2f} | {mlups:<10.2f} | "
+            f"{referencia / duracao:<10.2f}"
+        )
+    print("-" * 60)
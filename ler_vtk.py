@@ -3,7 +3,15 @@ import matplotlib.pyplot as plt
 import re
 import os
 import glob
-import pyvista as pv
+import time
+import base64
+import contextlib
+import mmap
+import zlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_lbm
 
 # =============================================================================
 # Configurações de Plotagem
@@ -29,6 +37,18 @@ if not hasattr(np, "bool"):
 # =============================================================================
 # Extração de Dados do Banco de Dados (.db)
 # =============================================================================
+# Padrões dos parâmetros do .db, compilados uma vez (varreduras de
+# campanhas leem centenas de arquivos)
+PADROES_DB = {
+    "tau": re.compile(r"tau\s*=\s*([\d.]+)"),
+    "F": re.compile(r"F\s*=\s*([^,]+),\s*([^,]+),\s*([^\s,]+)"),
+    "N": re.compile(r"N\s*=\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)"),
+    "porosity": re.compile(r"PorosityList\s*=\s*([\d.,\s]+)"),
+    "permeability": re.compile(r"PermeabilityList\s*=\s*([\d.,\s]+)"),
+    "h": re.compile(r"voxel_length\s*=\s*([\d.]+)"),
+}
+
+
 def extract_values_from_db(file_path):
     """Extrai valores do arquivo de configuração .db do LBPM."""
     values = {}
@@ -36,17 +56,8 @@ def extract_values_from_db(file_path):
         with open(file_path, "r") as file:
             content = file.read()
 
-        patterns = {
-            "tau": r"tau\s*=\s*([\d.]+)",
-            "F": r"F\s*=\s*([^,]+),\s*([^,]+),\s*([^\s,]+)",
-            "N": r"N\s*=\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)",
-            "porosity": r"PorosityList\s*=\s*([\d.,\s]+)",
-            "permeability": r"PermeabilityList\s*=\s*([\d.,\s]+)",
-            "h": r"voxel_length\s*=\s*([\d.]+)",
-        }
-
-        for key, pattern in patterns.items():
-            match = re.search(pattern, content)
+        for key, pattern in PADROES_DB.items():
+            match = pattern.search(content)
             if match:
                 if key == "tau":
                     values["tau"] = float(match.group(1))
@@ -89,58 +100,28 @@ def permeabilidade_lbpm(pasta_simulacao):
     Procura o arquivo output_XX.log com o maior XX dentro da pasta da simulação.
     Extrai o último valor de permeabilidade (em mD) registrado e converte para Darcy.
 
+    O log é lido de trás para frente, em blocos, até o último registro: o
+    custo não depende do tamanho do log (ver `ultima_permeabilidade_log`).
+
     Retorna: (permeabilidade_darcy, permeabilidade_mD)
     """
     if not os.path.exists(pasta_simulacao):
         print(f"Erro: Pasta '{pasta_simulacao}' não encontrada.")
         return None, None
 
-    arquivos = []
-    for f in os.listdir(pasta_simulacao):
-        match = re.match(r"output_(\d+)\.log", f)
-        if match:
-            arquivos.append((int(match.group(1)), f))
-
-    if not arquivos:
+    caminho_arquivo = log_lbpm_mais_recente(pasta_simulacao)
+    if caminho_arquivo is None:
         print("Erro: Nenhum arquivo output_XX.log encontrado.")
         return None, None
 
-    # Pega o arquivo com maior número XX
-    maior_arquivo = sorted(arquivos, key=lambda x: x[0])[-1][1]
-    caminho_arquivo = os.path.join(pasta_simulacao, maior_arquivo)
-
-    ultimo_valor_md = None
-    linha_anterior = ""
-    regex_tracos = re.compile(r"^-+$")
-    regex_numero = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
-
     try:
-        with open(caminho_arquivo, "r", encoding="utf-8") as file:
-            for linha in file:
-                linha_limpa = linha.strip()
-
-                if regex_tracos.fullmatch(linha_limpa) and linha_anterior:
-                    if "[mD]" in linha_anterior:
-                        parte_antes = linha_anterior.split("[mD]")[0]
-                        numeros = regex_numero.findall(parte_antes)
-                        if numeros:
-                            ultimo_valor_md = float(numeros[-1])
-                    else:
-                        numeros = regex_numero.findall(linha_anterior)
-                        if numeros:
-                            ultimo_valor_md = float(numeros[-1])
-
-                if linha_limpa:
-                    linha_anterior = linha_limpa
-
+        ultimo_valor_md = ultima_permeabilidade_log(caminho_arquivo)
     except Exception as e:
         print(f"Erro ao ler o log: {e}")
         return None, None
 
     if ultimo_valor_md is not None:
-        # Fator de conversão aproximado de mD para um2
-        valor_um2 = ultimo_valor_md * 0.0009869233
-        return valor_um2, ultimo_valor_md
+        return _converter_md(ultimo_valor_md), ultimo_valor_md
     else:
         print("Valor de permeabilidade não encontrado no log.")
         return None, None
@@ -154,44 +135,643 @@ def perfil_velocidade_lbpm(pasta_simulacao):
 
     Retorna: Um array 1D com o perfil de velocidades ao longo da largura (x).
     """
-    # Encontrar pastas 'vis*' dentro da pasta da simulação
-    padrao_vis = os.path.join(pasta_simulacao, "vis*")
-    vis_folders = glob.glob(padrao_vis)
+    # Pasta vis* mais recente, em ordem numérica
+    vis_folders = _pastas_vis(pasta_simulacao)
 
     if not vis_folders:
         raise FileNotFoundError(
             f"Nenhuma pasta vis* encontrada em {pasta_simulacao}."
         )
 
-    # Ordenar numericamente para pegar a mais recente
-    def extract_number(folder_name):
-        nums = re.findall(r"\d+", os.path.basename(folder_name))
-        return int(nums[0]) if nums else -1
-
-    vis_folders.sort(key=extract_number)
-    latest_vis = vis_folders[-1]
+    latest_vis = vis_folders[-1][1]
 
     grid_file = os.path.join(latest_vis, "summary.pvti")
     if not os.path.exists(grid_file):
         raise FileNotFoundError(f"Arquivo {grid_file} não encontrado.")
 
     print(f"Lendo dados espaciais de: {grid_file}")
-    grid = pv.read(grid_file)
-
-    # Extração e redimensionamento da malha de células
-    nx, ny, nz = grid.dimensions
-    shape = (nx - 1, ny - 1, nz - 1)
-
-    # Extrair velocidade na direção z (fluxo)
-    vz_flat = grid.cell_data["Velocity_z"]
-    vz_3d = vz_flat.reshape(shape, order="F")
 
-    # Mapeamento do shape em python:
+    # Mapeamento dos eixos (ordem do VTK, x varia mais rápido):
     # Eixo 0 = x (largura)
     # Eixo 1 = y (profundidade)
     # Eixo 2 = z (fluxo)
     #
     # Para ter um perfil em "x" onde calculamos a média de y e z:
-    perfil_x = np.mean(vz_3d, axis=(1, 2))
+    return perfil_pvti(grid_file, "Velocity_z")
+
+
+def _pastas_vis(pasta_simulacao):
+    """Pastas vis* da simulação em ordem numérica: lista de (passo, caminho)."""
+    pastas = []
+    for caminho in glob.glob(os.path.join(pasta_simulacao, "vis*")):
+        nums = re.findall(r"\d+", os.path.basename(caminho))
+        pastas.append((int(nums[0]) if nums else -1, caminho))
+    return sorted(pastas)
+
+
+def serie_perfis_lbpm(
+    pasta_simulacao, campo="Velocity_z", threads=None, arquivo_indice=None
+):
+    """
+    Evolução do perfil em x (média em y e z) ao longo de todas as pastas
+    vis* da simulação, para acompanhar a convergência do LBPM.
+
+    Os perfis ficam em um índice (`arquivo_indice`, padrão
+    perfis_<campo>.npz na pasta da simulação) identificado pelo nome de
+    cada pasta e pelo mtime (ns) do seu summary.pvti ou da própria pasta,
+    o que for mais recente. Em chamadas seguintes, apenas pastas novas ou
+    alteradas são lidas, em paralelo em um pool de `threads` threads;
+    pastas sem summary.pvti ou ainda incompletas são ignoradas e lidas
+    numa chamada futura. O índice é regravado de forma atômica mesmo se a
+    leitura for interrompida.
+
+    Retorna: (passos, perfis), com o número de cada pasta vis* e um array
+    (número de pastas, nx) com os perfis em ordem.
+    """
+    if arquivo_indice is None:
+        arquivo_indice = os.path.join(pasta_simulacao, f"perfis_{campo}.npz")
+
+    instantaneos = []
+    for passo, pasta in _pastas_vis(pasta_simulacao):
+        grid_file = os.path.join(pasta, "summary.pvti")
+        try:
+            mtime = max(
+                os.stat(pasta).st_mtime_ns, os.stat(grid_file).st_mtime_ns
+            )
+        except FileNotFoundError:
+            continue
+        instantaneos.append((passo, os.path.basename(pasta), mtime, grid_file))
+
+    indice = _ler_indice_perfis(arquivo_indice)
+    perfis = {}
+    pendentes = []
+    for _, nome, mtime, grid_file in instantaneos:
+        if indice.get(nome, (None,))[0] == mtime:
+            perfis[nome] = indice[nome][1]
+        else:
+            pendentes.append((nome, grid_file))
+
+    if pendentes:
+        print(
+            f"Perfis de {pasta_simulacao}: {len(instantaneos) - len(pendentes)}"
+            f" no índice, {len(pendentes)} a ler."
+        )
+
+        def ler(pendente):
+            nome, grid_file = pendente
+            try:
+                return nome, perfil_pvti(grid_file, campo, threads=1)
+            except (OSError, ValueError, KeyError, ET.ParseError) as e:
+                print(f"Aviso: {grid_file} ignorado ({e}).")
+                return nome, None
+
+        def gravar():
+            _gravar_indice_perfis(
+                arquivo_indice,
+                [
+                    (nome, mtime, perfis[nome])
+                    for _, nome, mtime, _ in instantaneos
+                    if nome in perfis
+                ],
+            )
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                for nome, perfil in pool.map(ler, pendentes):
+                    if perfil is not None:
+                        perfis[nome] = perfil
+        except BaseException:
+            # guarda o que já foi lido sem mascarar a exceção original
+            with contextlib.suppress(Exception):
+                gravar()
+            raise
+        gravar()
+
+    lidos = [
+        (passo, perfis[nome])
+        for passo, nome, _, _ in instantaneos
+        if nome in perfis
+    ]
+    if not lidos:
+        return np.array([], dtype=int), np.empty((0, 0))
+    return (
+        np.array([passo for passo, _ in lidos]),
+        np.array([perfil for _, perfil in lidos]),
+    )
+
+
+def _ler_indice_perfis(arquivo_indice):
+    """Índice de perfis {pasta: (mtime_ns, perfil)}; vazio se ilegível."""
+    try:
+        with np.load(arquivo_indice) as dados:
+            return {
+                str(nome): (int(mtime), perfil)
+                for nome, mtime, perfil in zip(
+                    dados["pastas"], dados["mtimes"], dados["perfis"]
+                )
+            }
+    except (FileNotFoundError, OSError, ValueError, KeyError):
+        return {}
+
+
+def _gravar_indice_perfis(arquivo_indice, entradas):
+    """Grava as entradas (pasta, mtime_ns, perfil) do índice, atomicamente."""
+    perfis = np.array([e[2] for e in entradas])
+    with cache_lbm.escrita_atomica(arquivo_indice) as arquivo:
+        np.savez(
+            arquivo,
+            pastas=np.array([e[0] for e in entradas], dtype=str),
+            mtimes=np.array([e[1] for e in entradas], dtype=np.int64),
+            perfis=perfis if entradas else np.empty((0, 0)),
+        )
+
+
+# =============================================================================
+# Leitura de logs do LBPM
+# =============================================================================
+# Um registro de permeabilidade é a última linha não vazia antes de uma
+# linha de traços; o valor é o último número antes de "[mD]" (ou da linha)
+REGEX_TRACOS = re.compile(r"^-+$")
+REGEX_NUMERO = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
+
+
+def _converter_md(valor_md):
+    # Fator de conversão aproximado de mD para um2
+    return valor_md * 0.0009869233
+
+
+def _valor_registro(linha):
+    """Permeabilidade (mD) da linha de um registro, ou None."""
+    numeros = REGEX_NUMERO.findall(linha.split("[mD]")[0])
+    return float(numeros[-1]) if numeros else None
+
+
+def log_lbpm_mais_recente(pasta_simulacao):
+    """Caminho do output_XX.log com o maior XX na pasta, ou None."""
+    arquivos = []
+    for f in os.listdir(pasta_simulacao):
+        match = re.match(r"output_(\d+)\.log", f)
+        if match:
+            arquivos.append((int(match.group(1)), f))
+    if not arquivos:
+        return None
+    return os.path.join(pasta_simulacao, max(arquivos)[1])
+
+
+def _linhas_reversas(caminho, fim=None, bloco=1 << 16):
+    """
+    Linhas de `caminho` (bytes, sem a quebra), da última para a primeira,
+    terminando no byte `fim` (padrão: fim do arquivo). O arquivo é lido em
+    blocos a partir do fim, então parar cedo custa apenas os últimos blocos.
+    """
+    with open(caminho, "rb") as arquivo:
+        if fim is None:
+            fim = arquivo.seek(0, os.SEEK_END)
+        resto = b""
+        while fim > 0:
+            inicio = max(0, fim - bloco)
+            arquivo.seek(inicio)
+            linhas = (arquivo.read(fim - inicio) + resto).split(b"\n")
+            # a primeira linha do bloco pode continuar no bloco anterior
+            resto = linhas[0]
+            yield from reversed(linhas[1:])
+            fim = inicio
+        yield resto
+
+
+def ultima_permeabilidade_log(caminho_log, bloco=1 << 16):
+    """
+    Último valor de permeabilidade (mD) registrado em um log do LBPM, ou
+    None. Lê o arquivo do fim para o início e para no último registro, com
+    o mesmo resultado da leitura completa do log.
+    """
+    return _ultimo_registro(_linhas_reversas(caminho_log, bloco=bloco))
+
+
+def _ultimo_registro(linhas_reversas):
+    seguida_de_tracos = False
+    for linha in linhas_reversas:
+        linha = linha.decode("utf-8", errors="replace").strip()
+        if not linha:
+            continue
+        if seguida_de_tracos:
+            valor = _valor_registro(linha)
+            if valor is not None:
+                return valor
+        seguida_de_tracos = REGEX_TRACOS.fullmatch(linha) is not None
+    return None
+
+
+class AcompanhamentoLbpm:
+    """
+    Acompanha a permeabilidade de uma simulação do LBPM em andamento.
+
+    Cada chamada de `atualizar` lê apenas os bytes acrescentados ao log
+    desde a anterior (a posição fica guardada), então monitorar muitas
+    simulações custa proporcional ao que elas escreveram. Linhas ainda
+    incompletas ficam para a próxima chamada. Se um output_XX.log mais
+    novo aparecer (reinício) ou o log for truncado, a leitura recomeça
+    nele.
+
+    Com `do_fim`, o histórico já gravado não é relido: a primeira
+    atualização informa só o último valor (leitura reversa) e as
+    seguintes, os novos registros.
+    """
+
+    def __init__(self, pasta_simulacao, do_fim=True):
+        self.pasta_simulacao = pasta_simulacao
+        self.do_fim = do_fim
+        self.caminho = None
+        self.posicao = 0
+        self.linha_anterior = ""
+        self.ultimo_md = None
+
+    def _abrir(self, caminho):
+        self.caminho = caminho
+        self.posicao = 0
+        self.linha_anterior = ""
+        if not self.do_fim:
+            return []
+        # posiciona após a última linha completa e lembra a última linha
+        # não vazia antes dela, como se o log tivesse sido lido até ali
+        tamanho = os.path.getsize(caminho)
+        self.posicao = tamanho - len(next(_linhas_reversas(caminho, tamanho)))
+        for linha in _linhas_reversas(caminho, self.posicao):
+            linha = linha.decode("utf-8", errors="replace").strip()
+            if linha:
+                self.linha_anterior = linha
+                break
+        valor = _ultimo_registro(_linhas_reversas(caminho, self.posicao))
+        return [] if valor is None else [valor]
+
+    def atualizar(self):
+        """
+        Lê o que foi acrescentado ao log.
+
+        Retorna: lista com os novos valores de permeabilidade (mD), na
+        ordem do log (vazia se não houver novos registros).
+        """
+        caminho = log_lbpm_mais_recente(self.pasta_simulacao)
+        if caminho is None:
+            return []
+        novos = []
+        if caminho != self.caminho or os.path.getsize(caminho) < self.posicao:
+            novos += self._abrir(caminho)
+
+        with open(caminho, "rb") as arquivo:
+            arquivo.seek(self.posicao)
+            dados = arquivo.read()
+        fim = dados.rfind(b"\n") + 1
+        self.posicao += fim
+        for linha in dados[:fim].decode("utf-8", errors="replace").splitlines():
+            linha = linha.strip()
+            if REGEX_TRACOS.fullmatch(linha) and self.linha_anterior:
+                valor = _valor_registro(self.linha_anterior)
+                if valor is not None:
+                    novos.append(valor)
+            if linha:
+                self.linha_anterior = linha
+
+        if novos:
+            self.ultimo_md = novos[-1]
+        return novos
+
+
+def acompanhar_permeabilidade_lbpm(pastas, intervalo=30.0, do_fim=True):
+    """
+    Gerador para o monitoramento de várias simulações do LBPM: a cada
+    `intervalo` segundos, verifica os logs de todas as `pastas` e produz
+    (pasta, permeabilidade_um2, permeabilidade_mD) para cada novo registro.
+    Não termina sozinho; interrompa o laço quando quiser.
+    """
+    if isinstance(pastas, str):
+        pastas = [pastas]
+    acompanhamentos = [AcompanhamentoLbpm(p, do_fim) for p in pastas]
+    while True:
+        for acompanhamento in acompanhamentos:
+            for valor_md in acompanhamento.atualizar():
+                yield (
+                    acompanhamento.pasta_simulacao,
+                    _converter_md(valor_md),
+                    valor_md,
+                )
+        time.sleep(intervalo)
+
+
+# =============================================================================
+# Leitura seletiva de arquivos PVTI
+# =============================================================================
+def ler_indice_pvti(caminho_pvti):
+    """
+    Lê o índice de um summary.pvti, sem abrir as peças.
+
+    Retorna: dicionário com "extensao" (x0, x1, y0, y1, z0, z1) do
+    reticulado inteiro em pontos, "campos" (nomes dos arrays de célula) e
+    "pecas", uma lista de (extensao, caminho do .vti).
+    """
+    raiz = ET.parse(caminho_pvti).getroot()
+    grade = raiz.find("PImageData")
+    if grade is None:
+        raise ValueError(f"{caminho_pvti} não é um arquivo PImageData.")
+    pasta = os.path.dirname(caminho_pvti)
+
+    def extensao(texto):
+        return tuple(int(v) for v in texto.split())
+
+    return {
+        "extensao": extensao(grade.get("WholeExtent")),
+        "campos": [
+            array.get("Name")
+            for array in grade.iterfind("PCellData/PDataArray")
+        ],
+        "pecas": [
+            (
+                extensao(peca.get("Extent")),
+                os.path.join(pasta, peca.get("Source")),
+            )
+            for peca in grade.iterfind("Piece")
+        ],
+    }
+
+
+def ler_campo_vti(caminho_vti, campo):
+    """
+    Lê de um .vti apenas o array de célula `campo` (os demais arrays não
+    são decodificados).
+
+    Usa o decodificador nativo (ver `blocos_campo_vti`): dados anexados
+    brutos e sem compressão viram um np.memmap, sem cópia; base64, zlib e
+    ascii são decodificados em memória. Outras codificações recaem no
+    leitor XML do VTK (o backend do pyvista), importado só nesse caso.
+
+    Retorna: array (nx, ny, nz), ou (nx, ny, nz, componentes) para
+    campos vetoriais, das células da peça.
+    """
+    try:
+        cabecalho = cabecalho_vti(caminho_vti)
+        array = _array_vti(cabecalho, campo, caminho_vti)
+        blocos = list(blocos_campo_vti(caminho_vti, campo, cabecalho))
+        valores = blocos[0] if len(blocos) == 1 else np.concatenate(blocos)
+        extensao = cabecalho["extensao"]
+        componentes = int(array.get("NumberOfComponents", 1))
+    except NotImplementedError:
+        valores, extensao, componentes = _ler_campo_vti_vtk(caminho_vti, campo)
+
+    x0, x1, y0, y1, z0, z1 = extensao
+    # ordem do VTK: x varia mais rápido, componentes intercaladas
+    forma = (z1 - z0, y1 - y0, x1 - x0)
+    if componentes > 1:
+        return valores.reshape(forma + (componentes,)).transpose(2, 1, 0, 3)
+    return valores.reshape(forma).transpose(2, 1, 0)
+
+
+# Tipos do VTK XML
+TIPOS_VTK = {
+    "Int8": "i1",
+    "UInt8": "u1",
+    "Int16": "i2",
+    "UInt16": "u2",
+    "Int32": "i4",
+    "UInt32": "u4",
+    "Int64": "i8",
+    "UInt64": "u8",
+    "Float32": "f4",
+    "Float64": "f8",
+}
+
+
+def _atributos(tag):
+    return dict(re.findall(r'([\w:]+)\s*=\s*"([^"]*)"', tag))
+
+
+def cabecalho_vti(caminho_vti):
+    """
+    Lê o cabeçalho XML de um .vti (ImageData de uma peça) sem decodificar
+    os dados: a busca pela seção AppendedData é feita sobre o arquivo
+    mapeado em memória, sem lê-lo inteiro.
+
+    Retorna: dicionário com extensao (x0, x1, y0, y1, z0, z1) em pontos,
+    ordem ("<" ou ">"), tipo_tamanho (dtype dos tamanhos nos cabeçalhos
+    binários), compressor, campos {nome: atributos do DataArray de
+    célula, com o texto em "texto" se inline}, anexo (posição do primeiro
+    byte dos dados anexados, ou None) e codificacao_anexo.
+    """
+    with open(caminho_vti, "rb") as arquivo, mmap.mmap(
+        arquivo.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapa:
+        posicao = mapa.find(b"<AppendedData")
+        anexo = codificacao = None
+        if posicao >= 0:
+            fim_tag = mapa.find(b">", posicao)
+            tag = mapa[posicao:fim_tag].decode("latin-1")
+            codificacao = _atributos(tag).get("encoding", "raw")
+            # os dados começam depois do "_" que marca o início da seção
+            anexo = mapa.find(b"_", fim_tag) + 1
+            texto = mapa[:posicao].decode("latin-1")
+        else:
+            texto = mapa[:].decode("latin-1")
+
+    arquivo_vtk = re.search(r"<VTKFile\b([^>]*)>", texto)
+    pecas = re.findall(r"<Piece\b([^>]*)>", texto)
+    if arquivo_vtk is None or len(pecas) != 1:
+        raise NotImplementedError("Apenas .vti com uma única peça.")
+    atributos = _atributos(arquivo_vtk.group(1))
+    if atributos.get("type") != "ImageData":
+        raise NotImplementedError("Apenas arquivos ImageData.")
+
+    celulas = re.search(r"<CellData\b[^>]*>(.*?)</CellData>", texto, re.S)
+    campos = {}
+    for tag, _, conteudo in re.findall(
+        r"<DataArray\b([^>]*?)(/>|>(.*?)</DataArray>)",
+        celulas.group(1) if celulas else "",
+        re.S,
+    ):
+        array = _atributos(tag)
+        # elementos filhos (InformationKey) não fazem parte dos dados
+        array["texto"] = re.sub(r"<.*", "", conteudo, flags=re.S)
+        campos[array.get("Name")] = array
+
+    tamanho = {"UInt32": "u4", "UInt64": "u8"}.get(
+        atributos.get("header_type", "UInt32")
+    )
+    if tamanho is None:
+        raise NotImplementedError("header_type desconhecido.")
+    ordem = "<" if atributos.get("byte_order") != "BigEndian" else ">"
+    return {
+        "extensao": tuple(
+            int(v) for v in _atributos(pecas[0])["Extent"].split()
+        ),
+        "ordem": ordem,
+        "tipo_tamanho": np.dtype(ordem + tamanho),
+        "compressor": atributos.get("compressor"),
+        "campos": campos,
+        "anexo": anexo,
+        "codificacao_anexo": codificacao,
+    }
+
+
+def _array_vti(cabecalho, campo, caminho_vti):
+    if campo not in cabecalho["campos"]:
+        raise KeyError(f"Campo '{campo}' ausente em {caminho_vti}.")
+    array = cabecalho["campos"][campo]
+    if array.get("type") not in TIPOS_VTK:
+        raise NotImplementedError(f"Tipo {array.get('type')} não suportado.")
+    if cabecalho["compressor"] not in (None, "vtkZLibDataCompressor"):
+        raise NotImplementedError(f"Compressor {cabecalho['compressor']}.")
+    return array
+
+
+def blocos_campo_vti(caminho_vti, campo, cabecalho=None):
+    """
+    Decodifica o array de célula `campo` de um .vti sem o VTK, gerando os
+    valores (1D, componentes intercaladas) em blocos.
+
+    Dados anexados brutos e sem compressão geram um único np.memmap do
+    arquivo (nenhuma cópia); com compressão zlib, cada bloco do VTK é
+    descomprimido só quando pedido. Dados base64 (inline ou anexados) e
+    ascii também são aceitos. Codificações não tratadas levantam
+    NotImplementedError.
+    """
+    if cabecalho is None:
+        cabecalho = cabecalho_vti(caminho_vti)
+    array = _array_vti(cabecalho, campo, caminho_vti)
+    tipo = np.dtype(cabecalho["ordem"] + TIPOS_VTK[array["type"]])
+    formato = array.get("format")
+    comprimido = cabecalho["compressor"] is not None
+
+    if formato == "ascii":
+        yield np.array(array["texto"].split(), dtype=tipo.newbyteorder("="))
+        return
+    if formato == "binary":
+        dados = "".join(array["texto"].split()).encode("ascii")
+        yield from _blocos_binarios(
+            dados, 0, True, comprimido, cabecalho["tipo_tamanho"], tipo
+        )
+        return
+    if formato != "appended" or cabecalho["anexo"] is None:
+        raise NotImplementedError(f"Formato {formato} não suportado.")
+
+    posicao = cabecalho["anexo"] + int(array["offset"])
+    base64_ = cabecalho["codificacao_anexo"] == "base64"
+    if cabecalho["codificacao_anexo"] not in ("raw", "base64"):
+        raise NotImplementedError("Codificação dos dados anexados.")
+    tamanho = cabecalho["tipo_tamanho"]
+    if not base64_ and not comprimido:
+        # zero cópia: [tamanho em bytes][dados]
+        n_bytes = int(
+            np.memmap(caminho_vti, tamanho, "r", offset=posicao, shape=(1,))[0]
+        )
+        yield np.memmap(
+            caminho_vti,
+            tipo,
+            "r",
+            offset=posicao + tamanho.itemsize,
+            shape=(n_bytes // tipo.itemsize,),
+        )
+        return
+    with open(caminho_vti, "rb") as arquivo, mmap.mmap(
+        arquivo.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapa:
+        yield from _blocos_binarios(
+            mapa, posicao, base64_, comprimido, tamanho, tipo
+        )
+
+
+def _base64(dados, posicao, n_bytes):
+    """Primeiros `n_bytes` decodificados do base64 que começa em `posicao`."""
+    caracteres = -(-n_bytes // 3) * 4
+    return base64.b64decode(dados[posicao : posicao + caracteres])[:n_bytes]
+
+
+def _blocos_binarios(dados, posicao, base64_, comprimido, tamanho, tipo):
+    """
+    Blocos de um array binário do VTK em `dados` (bytes ou mmap) a partir
+    de `posicao`. Sem compressão: [n bytes][dados]. Com compressão:
+    [n blocos][tamanho do bloco][tamanho do último][tamanhos comprimidos]
+    seguido dos blocos zlib; em base64, o cabeçalho comprimido é
+    codificado separadamente dos blocos.
+    """
+    h = tamanho.itemsize
+
+    def ler(inicio, n_bytes):
+        if base64_:
+            return _base64(dados, inicio, n_bytes)
+        return bytes(dados[inicio : inicio + n_bytes])
+
+    if not comprimido:
+        n_bytes = int(np.frombuffer(ler(posicao, h), tamanho)[0])
+        yield np.frombuffer(ler(posicao, h + n_bytes)[h:], tipo)
+        return
+
+    n_blocos = int(np.frombuffer(ler(posicao, h), tamanho)[0])
+    cabecalho = np.frombuffer(ler(posicao, (3 + n_blocos) * h), tamanho)
+    comprimidos = cabecalho[3:].astype(np.int64)
+    if base64_:
+        inicio = posicao + -(-(3 + n_blocos) * h // 3) * 4
+        dados = _base64(dados, inicio, int(comprimidos.sum()))
+        inicio = 0
+    else:
+        inicio = posicao + (3 + n_blocos) * h
+    for n_bytes in comprimidos:
+        yield np.frombuffer(
+            zlib.decompress(dados[inicio : inicio + n_bytes]), tipo
+        )
+        inicio += n_bytes
+
+
+def _ler_campo_vti_vtk(caminho_vti, campo):
+    """Leitura pelo VTK, para as codificações sem decodificador nativo."""
+    from vtkmodules.util.numpy_support import vtk_to_numpy
+    from vtkmodules.vtkIOXML import vtkXMLImageDataReader
+
+    leitor = vtkXMLImageDataReader()
+    leitor.SetFileName(caminho_vti)
+    leitor.UpdateInformation()
+    nomes = [
+        leitor.GetCellArrayName(i)
+        for i in range(leitor.GetNumberOfCellArrays())
+    ]
+    if campo not in nomes:
+        raise KeyError(f"Campo '{campo}' ausente em {caminho_vti}.")
+    for nome in nomes:
+        leitor.SetCellArrayStatus(nome, int(nome == campo))
+    leitor.Update()
+
+    imagem = leitor.GetOutput()
+    array = imagem.GetCellData().GetArray(campo)
+    valores = vtk_to_numpy(array).ravel()
+    return valores, imagem.GetExtent(), array.GetNumberOfComponents()
+
+
+def perfil_pvti(caminho_pvti, campo="Velocity_z", threads=None):
+    """
+    Perfil em x da média em y e z de um campo de célula de um PVTI.
+
+    Cada peça é lida (só o array `campo`) em um pool de `threads` threads
+    e reduzida logo em seguida a somas parciais em y e z por coluna x, de
+    modo que o pico de memória é de uma peça por thread, e não o volume
+    inteiro. As peças não podem se sobrepor (GhostLevel 0, como no LBPM).
+
+    Retorna: array 1D com a média em cada x.
+    """
+    indice = ler_indice_pvti(caminho_pvti)
+    x0, x1, y0, y1, z0, z1 = indice["extensao"]
+    celulas = sum(
+        (e[1] - e[0]) * (e[3] - e[2]) * (e[5] - e[4])
+        for e, _ in indice["pecas"]
+    )
+    if celulas != (x1 - x0) * (y1 - y0) * (z1 - z0):
+        raise ValueError(
+            f"As peças de {caminho_pvti} não cobrem o reticulado sem "
+            "sobreposição."
+        )
+
+    def reduzir(peca):
+        extensao, caminho = peca
+        return extensao[0] - x0, ler_campo_vti(caminho, campo).sum(axis=(1, 2))
 
-    return perfil_x
+    soma = np.zeros(x1 - x0)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for inicio, parcial in pool.map(reduzir, indice["pecas"]):
+            soma[inicio : inicio + parcial.size] += parcial
+    return soma / ((y1 - y0) * (z1 - z0))
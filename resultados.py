@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import analitico_2d_depth
@@ -13,6 +14,9 @@ if __name__ == "__main__":
     h = 8
     g_lat = [1.0e-8, 0.0]
 
+    # Motor do LBM autoral: o numba usa as NUMBA_NUM_THREADS do job
+    motor = os.environ.get("DEPTH_AVERAGE_MOTOR", "numba")
+
     # Média em profundidade analítico
     u_analitico_2d_depth = (
         analitico_2d_depth.perfil_velocidade_analitico_2d_depth(
@@ -27,10 +31,10 @@ if __name__ == "__main__":
 
     # Média em profundidade código autoral
     u_lbm_autoral = lbm_autoral.perfil_velocidade_lbm_autoral(
-        tau, Ny, g_lat, h, 1
+        tau, Ny, g_lat, h, 1, motor=motor
     )
     k_lbm_autoral, k_lbm_autoral_mD = lbm_autoral.permeabilidade_lbm_autoral(
-        tau, Ny, g_lat, h, 1
+        tau, Ny, g_lat, h, 1, motor=motor
     )
 
     # Média volumétrica analítico
@@ -135,8 +139,22 @@ if __name__ == "__main__":
         erro_k = abs(k_val - k_analitico_3d) / k_analitico_3d * 100
 
         # 2. Erro do Perfil de Velocidade
-        u_3d_interp = np.interp(x_array, x_analitico, u_analitico_3d)
-        erro_v = np.mean(abs(u_array - u_3d_interp) / u_3d_interp) * 100
+        # (analítico 3D avaliado nas próprias posições do perfil; pontos
+        # sobre as paredes, com u = 0, contam erro nulo)
+        u_3d_pontos = analitico_3d.perfil_velocidade_analitico_3d(
+            tau, Ny, g_lat[0], h, y=x_array
+        )
+        erro_v = (
+            np.mean(
+                np.divide(
+                    abs(u_array - u_3d_pontos),
+                    u_3d_pontos,
+                    out=np.zeros_like(u_3d_pontos),
+                    where=u_3d_pontos != 0,
+                )
+            )
+            * 100
+        )
 
         print(
             f"{desc:<30} | {k_val:<15.6e} | {k_md:<15.4f} | {erro_k:<15.4f} | {erro_v:<15.4f}"
@@ -15,5 +15,9 @@ module load conda
 # Ativar o ambiente Conda
 conda activate poropy
 
+# Threads do kernel numba (motor="numba") = CPUs reservadas
+export NUMBA_NUM_THREADS=${SLURM_CPUS_PER_TASK:-1}
+export DEPTH_AVERAGE_MOTOR=${DEPTH_AVERAGE_MOTOR:-numba}
+
 # Executar o script Python
 python -u resultados.py
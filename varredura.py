@@ -0,0 +1,411 @@
+import itertools
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import analitico_2d_depth
+import analitico_2d_grey
+import analitico_3d
+import cache_lbm
+import lbm_autoral
+
+# Colunas escalares da tabela de resultados, na ordem de exibição
+COLUNAS = [
+    ("tau", "f8"),
+    ("Ny", "i8"),
+    ("h", "f8"),
+    ("g_lat", "f8"),
+    ("status", "U10"),
+    ("k_lbm", "f8"),
+    ("k_lbm_mD", "f8"),
+    ("k_2d_depth", "f8"),
+    ("k_2d_grey", "f8"),
+    ("k_3d", "f8"),
+    ("tempo_s", "f8"),
+]
+
+
+def grade_parametros(tau, Ny, h, g_lat):
+    """
+    Produto cartesiano dos valores de cada parâmetro (escalares ou listas).
+
+    Retorna: lista de dicionários {"tau", "Ny", "h", "g_lat"}.
+    """
+    valores = [np.atleast_1d(p).tolist() for p in (tau, Ny, h, g_lat)]
+    return [
+        {"tau": float(t), "Ny": int(n), "h": float(a), "g_lat": float(g)}
+        for t, n, a, g in itertools.product(*valores)
+    ]
+
+
+def identificador_caso(caso):
+    """Chave estável de um caso, usada para retomar uma varredura."""
+    return cache_lbm.CacheResultados.chave(caso)
+
+
+def executar_caso(caso, motor="vetorizado", cache=True, convergencia=None):
+    """
+    Executa o LBM autoral e as soluções analíticas para um caso.
+
+    `convergencia` é um dicionário de argumentos de
+    `lbm_autoral.Convergencia` (sem saída no console por padrão).
+
+    Retorna: dicionário com os parâmetros, permeabilidades e perfis nos
+    centros das células. O status é "ok" se o LBM convergiu; senão, o
+    motivo da parada ("divergiu", "max_passos" ou "tempo_max").
+    """
+    tau = caso["tau"]
+    Ny = caso["Ny"]
+    h = caso["h"]
+    g_lat = caso["g_lat"]
+    opcoes_convergencia = {"callback": None}
+    opcoes_convergencia.update(convergencia or {})
+    convergencia = lbm_autoral.Convergencia(**opcoes_convergencia)
+
+    inicio = time.perf_counter()
+    u_lbm, k_lbm, k_lbm_mD = lbm_autoral.perfil_e_permeabilidade_lbm_autoral(
+        tau,
+        Ny,
+        [g_lat, 0.0],
+        h,
+        1,
+        motor=motor,
+        cache=cache,
+        convergencia=convergencia,
+    )
+
+    y = np.arange(Ny) + 0.5
+    u_2d_depth = analitico_2d_depth.perfil_velocidade_analitico_2d_depth(
+        tau, Ny, g_lat, h, y=y
+    )
+    k_2d_depth, _ = analitico_2d_depth.permeabilidade_analitica_2d_depth(
+        tau, Ny, g_lat, h
+    )
+    k_2d_grey, _ = analitico_2d_grey.permeabilidade_analitica_2d_grey(
+        tau, Ny, g_lat, h
+    )
+    k_3d, _ = analitico_3d.permeabilidade_analitica_3d(tau, Ny, g_lat, h)
+
+    return {
+        **caso,
+        "status": (
+            "ok" if convergencia.motivo == "convergiu" else convergencia.motivo
+        ),
+        "k_lbm": float(k_lbm),
+        "k_lbm_mD": float(k_lbm_mD),
+        "k_2d_depth": float(k_2d_depth),
+        "k_2d_grey": float(k_2d_grey),
+        "k_3d": float(k_3d),
+        "tempo_s": time.perf_counter() - inicio,
+        "perfil_lbm": u_lbm.tolist(),
+        "perfil_2d_depth": u_2d_depth.tolist(),
+    }
+
+
+def _executar_caso_protegido(caso, opcoes, id_caso=None, em_execucao=None):
+    """
+    Como `executar_caso`, mas transforma exceções em um registro de falha.
+
+    Com `em_execucao` (dicionário compartilhado), o caso fica marcado nele
+    enquanto executa: se o processo morrer, a marca permanece e identifica
+    o caso responsável.
+    """
+    if em_execucao is not None:
+        em_execucao[id_caso] = os.getpid()
+    try:
+        return executar_caso(caso, **opcoes)
+    except Exception as e:
+        return _registro_falha(caso, e, traceback.format_exc())
+    finally:
+        if em_execucao is not None:
+            em_execucao.pop(id_caso, None)
+
+
+def _registro_falha(caso, erro, detalhes=""):
+    return {
+        **caso,
+        "status": "falhou",
+        "erro": f"{type(erro).__name__}: {erro}",
+        "detalhes": detalhes,
+    }
+
+
+def _ler_registros(arquivo):
+    """Último registro de cada caso no arquivo JSON lines da varredura."""
+    registros = {}
+    if not os.path.exists(arquivo):
+        return registros
+    with open(arquivo, "r", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                # linha truncada por uma interrupção durante a escrita
+                continue
+            registros[registro["id"]] = registro
+    return registros
+
+
+def _anexar_registro(arquivo, registro):
+    with open(arquivo, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def executar_varredura(
+    casos,
+    arquivo="varredura.jsonl",
+    processos=None,
+    repetir_falhas=True,
+    **opcoes,
+):
+    """
+    Distribui os casos entre um pool de processos e grava cada resultado,
+    assim que fica pronto, em `arquivo` (JSON lines).
+
+    Casos já concluídos no arquivo são pulados, de modo que uma varredura
+    interrompida pode ser retomada com a mesma chamada. Falhas de um caso
+    (exceções ou simulações que não convergiram) são registradas sem
+    interromper os demais e, com `repetir_falhas`, executadas de novo na
+    retomada. Se o processo de um caso morrer
+    (memória, sinal), só esse caso é registrado como falha: os que
+    estavam em execução junto dele são isolados em processos próprios e
+    os demais seguem em um pool novo. `opcoes` são repassadas para
+    `executar_caso` (motor, cache, convergencia).
+
+    Retorna: (tabela, perfis), como em `carregar_varredura`.
+    """
+    registros = _ler_registros(arquivo)
+    pendentes = {}
+    for caso in casos:
+        id_caso = identificador_caso(caso)
+        anterior = registros.get(id_caso)
+        if anterior is not None and (
+            anterior["status"] == "ok" or not repetir_falhas
+        ):
+            continue
+        pendentes[id_caso] = caso
+
+    if processos is None:
+        processos = lbm_autoral.numero_processos()
+    print(
+        f"Varredura: {len(casos)} casos, {len(casos) - len(pendentes)} já "
+        f"concluídos, {len(pendentes)} a executar em {processos} processos."
+    )
+
+    contador = itertools.count(1)
+
+    def concluir(id_caso, registro):
+        registro["id"] = id_caso
+        _anexar_registro(arquivo, registro)
+        print(
+            f"[{next(contador)}/{len(pendentes)}] {registro['status']}: "
+            f"tau={registro['tau']} Ny={registro['Ny']} "
+            f"h={registro['h']} g_lat={registro['g_lat']}"
+        )
+
+    if pendentes:
+        with mp.Manager() as gerente:
+            em_execucao = gerente.dict()
+            fila = dict(pendentes)
+            while fila:
+                fila, suspeitos = _executar_pool(
+                    fila, processos, opcoes, em_execucao, concluir
+                )
+                if len(suspeitos) > 1:
+                    # o pool encerra os demais processos ao quebrar: cada
+                    # caso que estava em execução roda sozinho para isolar
+                    # o responsável
+                    _executar_isolados(suspeitos, opcoes, em_execucao, concluir)
+                elif suspeitos:
+                    ((id_caso, caso),) = suspeitos.items()
+                    concluir(id_caso, _registro_falha(caso, _ERRO_PROCESSO))
+
+    return carregar_varredura(arquivo, casos)
+
+
+_ERRO_PROCESSO = BrokenProcessPool(
+    "o processo do caso terminou abruptamente (memória, sinal...)"
+)
+
+
+def _executar_pool(casos, processos, opcoes, em_execucao, concluir):
+    """
+    Executa `casos` ({id: caso}) em um pool, chamando `concluir(id,
+    registro)` à medida que terminam.
+
+    Se um processo morrer, o pool quebra e os casos não concluídos são
+    separados entre os que estavam em execução (suspeitos, marcados em
+    `em_execucao`) e os demais, a reenviar para um pool novo.
+
+    Retorna: (restantes, suspeitos), dicionários {id: caso}; vazios se o
+    pool não quebrou.
+    """
+    em_execucao.clear()
+    restantes = {}
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        futuros = {
+            pool.submit(
+                _executar_caso_protegido, caso, opcoes, id_caso, em_execucao
+            ): id_caso
+            for id_caso, caso in casos.items()
+        }
+        for futuro in as_completed(futuros):
+            id_caso = futuros[futuro]
+            try:
+                registro = futuro.result()
+            except BrokenProcessPool:
+                restantes[id_caso] = casos[id_caso]
+                continue
+            concluir(id_caso, registro)
+
+    suspeitos = {i: restantes.pop(i) for i in list(em_execucao.keys())}
+    if restantes or suspeitos:
+        if not suspeitos:
+            raise RuntimeError(
+                "O pool de processos quebrou sem nenhum caso em execução."
+            )
+        print(
+            f"Processo morto durante {len(suspeitos)} caso(s); "
+            f"{len(restantes)} reenviados a um novo pool."
+        )
+    return restantes, suspeitos
+
+
+def _executar_isolados(casos, opcoes, em_execucao, concluir):
+    """
+    Executa cada caso em um pool próprio de um processo, em paralelo:
+    a morte de um processo afeta só o seu caso, registrado como falha.
+    """
+    pools = {id_caso: ProcessPoolExecutor(max_workers=1) for id_caso in casos}
+    try:
+        futuros = {
+            pools[id_caso].submit(
+                _executar_caso_protegido, caso, opcoes, id_caso, em_execucao
+            ): id_caso
+            for id_caso, caso in casos.items()
+        }
+        for futuro in as_completed(futuros):
+            id_caso = futuros[futuro]
+            try:
+                registro = futuro.result()
+            except BrokenProcessPool:
+                registro = _registro_falha(casos[id_caso], _ERRO_PROCESSO)
+            concluir(id_caso, registro)
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+
+def carregar_varredura(arquivo, casos=None):
+    """
+    Monta a tabela de resultados a partir do arquivo da varredura.
+
+    Se `casos` for dado, as linhas seguem a ordem dos casos (os ausentes
+    ficam com status "pendente"); senão, a ordem do arquivo.
+
+    Retorna: (tabela, perfis), onde `tabela` é um array estruturado com as
+    COLUNAS e `perfis` um dicionário {"perfil_lbm", "perfil_2d_depth"} de
+    listas de arrays alinhadas com as linhas da tabela.
+    """
+    registros = _ler_registros(arquivo)
+    if casos is None:
+        linhas = list(registros.values())
+    else:
+        linhas = [
+            registros.get(identificador_caso(caso), {**caso}) for caso in casos
+        ]
+
+    tabela = np.zeros(len(linhas), dtype=COLUNAS)
+    perfis = {"perfil_lbm": [], "perfil_2d_depth": []}
+    for n, registro in enumerate(linhas):
+        for nome, tipo in COLUNAS:
+            if nome == "status":
+                tabela[nome][n] = registro.get("status", "pendente")
+            else:
+                tabela[nome][n] = registro.get(
+                    nome, -1 if tipo == "i8" else np.nan
+                )
+        for nome in perfis:
+            perfis[nome].append(np.asarray(registro.get(nome, [])))
+    return tabela, perfis
+
+
+def salvar_tabela(tabela, perfis, caminho):
+    """Grava a tabela em .npz (colunas) ou .csv (sem os perfis)."""
+    if caminho.endswith(".csv"):
+        np.savetxt(
+            caminho,
+            tabela,
+            delimiter=",",
+            header=",".join(tabela.dtype.names),
+            comments="",
+            fmt=[
+                "%s" if tipo.startswith("U") else "%.10g" for _, tipo in COLUNAS
+            ],
+        )
+        return
+    arrays = {nome: tabela[nome] for nome in tabela.dtype.names}
+    for nome, lista in perfis.items():
+        for n, perfil in enumerate(lista):
+            arrays[f"{nome}_{n}"] = perfil
+    np.savez(caminho, **arrays)
+
+
+def verificar_status(processos=1):
+    """
+    Confere, em uma varredura temporária com um caso estável e um que
+    diverge (tau = 0.4), que o caso divergente é registrado com status
+    "divergiu" e é o único executado de novo na retomada. Levanta
+    AssertionError se não for.
+    """
+    casos = grade_parametros(tau=[1.1, 0.4], Ny=24, h=8, g_lat=1.0e-8)
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "varredura.jsonl")
+        tabela, _ = executar_varredura(
+            casos, arquivo, processos=processos, cache=False
+        )
+        assert tabela["status"].tolist() == ["ok", "divergiu"], tabela
+        registros = _ler_registros(arquivo)
+        executar_varredura(casos, arquivo, processos=processos, cache=False)
+        with open(arquivo, "r", encoding="utf-8") as f:
+            repetidos = sum(1 for _ in f) - len(registros)
+    assert repetidos == 1, f"{repetidos} casos repetidos na retomada"
+    print("Varredura: caso divergente registrado e repetido na retomada.")
+
+
+if __name__ == "__main__":
+    verificar_status()
+
+    # Estudo do paper: larguras e aberturas dos casos de resultados.py
+    casos = grade_parametros(
+        tau=[0.9330127, 1.1], Ny=[24, 80], h=[8, 24, 80], g_lat=1.0e-8
+    )
+    tabela, perfis = executar_varredura(casos, "varredura.jsonl")
+
+    print("-" * 100)
+    print(
+        f"{'tau':<10} | {'Ny':<5} | {'h':<6} | {'k LBM (um²)':<15} | "
+        f"{'k 3D (um²)':<15} | {'Erro (%)':<10} | {'Status':<10}"
+    )
+    print("-" * 100)
+    for linha in tabela:
+        erro = abs(linha["k_lbm"] - linha["k_3d"]) / linha["k_3d"] * 100
+        print(
+            f"{linha['tau']:<10.4f} | {linha['Ny']:<5d} | {linha['h']:<6.1f} | "
+            f"{linha['k_lbm']:<15.6e} | {linha['k_3d']:<15.6e} | "
+            f"{erro:<10.4f} | {linha['status']:<10}"
+        )
+    print("-" * 100)
+    salvar_tabela(tabela, perfis, "varredura.npz")